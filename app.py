@@ -1,32 +1,143 @@
 # app.py
 
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, Blueprint, render_template, request, redirect, url_for, flash, abort, Response, \
+    stream_with_context, g, has_request_context, current_app, make_response
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_bootstrap import Bootstrap5
 from flask_migrate import Migrate
 from dotenv import load_dotenv
+from jinja2 import FileSystemBytecodeCache
+import click
 import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from flask import jsonify
-from sqlalchemy import func
+from markupsafe import Markup
+from sqlalchemy import func, and_, or_, case, insert, update, event, inspect, select, literal, union_all, text, \
+    bindparam, extract
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+from werkzeug.exceptions import HTTPException
+from collections import defaultdict
+import calendar
+import hashlib
 import json
+import random
+import threading
+import time
+import traceback
+from contextlib import contextmanager
 from flask_apscheduler import APScheduler
+from vendor_index import VendorIndex
+from fragment_cache import FragmentCache
+from metrics import CallbackMetric, Counter, Gauge, Histogram, Registry
+from statement_import import build_expense_row, iter_csv_records, iter_ofx_records
+from reminders import RateLimiter, SmtpEmailBackend, SmtpSink, load_backend
+import io
+import csv
+import tempfile
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # XLSX export is optional
+    Workbook = None
+
+try:
+    import orjson
+except ImportError:  # The JSON API falls back to the standard library serializer
+    orjson = None
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'a_default_secret_key')
+def default_config():
+    """Settings read from the environment; create_app(config) overrides them."""
+    config = {
+        'SQLALCHEMY_DATABASE_URI': f"mysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}",
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'poolclass': TimedQueuePool},
+        'SECRET_KEY': os.getenv('SECRET_KEY', 'a_default_secret_key'),
+        'REPLICA_MAX_LAG_SECONDS': float(os.getenv('REPLICA_MAX_LAG_SECONDS', 10)),
+        'REPLICA_STICKY_SECONDS': float(os.getenv('REPLICA_STICKY_SECONDS', 10)),
+        # Per-request SQL budgets; requests over either one are logged with their slowest statements
+        'QUERY_COUNT_BUDGET': int(os.getenv('QUERY_COUNT_BUDGET', 30)),
+        'QUERY_TIME_BUDGET_MS': float(os.getenv('QUERY_TIME_BUDGET_MS', 200)),
+        'REPEATED_QUERY_THRESHOLD': int(os.getenv('REPEATED_QUERY_THRESHOLD', 5)),
+        'JINJA_CACHE_DIR': os.getenv('JINJA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'triples-jinja-cache')),
+        # Rent reminders; run `flask smtp-sink` and point SMTP_PORT at it to test delivery locally
+        'REMINDER_DAYS_AHEAD': int(os.getenv('REMINDER_DAYS_AHEAD', 3)),
+        'REMINDER_BATCH_SIZE': int(os.getenv('REMINDER_BATCH_SIZE', 200)),
+        'REMINDER_RATE_PER_SECOND': float(os.getenv('REMINDER_RATE_PER_SECOND', 5)),
+        'REMINDER_MAX_ATTEMPTS': int(os.getenv('REMINDER_MAX_ATTEMPTS', 5)),
+        'REMINDER_FROM_ADDRESS': os.getenv('REMINDER_FROM_ADDRESS', 'noreply@localhost'),
+        'SMTP_HOST': os.getenv('SMTP_HOST', 'localhost'),
+        'SMTP_PORT': int(os.getenv('SMTP_PORT', 25)),
+        'SMTP_USERNAME': os.getenv('SMTP_USERNAME'),
+        'SMTP_PASSWORD': os.getenv('SMTP_PASSWORD'),
+        'SMTP_USE_TLS': os.getenv('SMTP_USE_TLS', '').lower() in ('1', 'true', 'yes'),
+        'SMS_BACKEND': os.getenv('SMS_BACKEND', 'reminders:LoggingSmsBackend'),
+    }
+    # Optional read replica for GET and reporting traffic
+    if os.getenv('DB_REPLICA_HOST'):
+        config['SQLALCHEMY_BINDS'] = {
+            'replica': f"mysql://{os.getenv('DB_REPLICA_USER', os.getenv('DB_USER'))}:{os.getenv('DB_REPLICA_PASSWORD', os.getenv('DB_PASSWORD'))}@{os.getenv('DB_REPLICA_HOST')}/{os.getenv('DB_NAME')}"
+        }
+    return config
+
+# Served at /metrics; values are per process, so each worker reports its own
+metrics = Registry()
+REQUEST_LATENCY = metrics.register(Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint.', ['endpoint', 'method']))
+REQUESTS = metrics.register(Counter(
+    'http_requests_total', 'Requests by endpoint and status.', ['endpoint', 'method', 'status']))
+REQUESTS_IN_FLIGHT = metrics.register(Gauge('http_requests_in_flight', 'Requests currently being handled.'))
+POOL_CHECKOUT_WAIT = metrics.register(Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a connection from the pool.',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)))
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+class RoutingSession(Session):
+    """Session that sends plain SELECTs to the replica bind when the request allows it.
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-bootstrap = Bootstrap5(app)
+    Flushes, INSERT/UPDATE/DELETE statements and explicit connection() calls always
+    use the primary.
+    """
 
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('read_replica') and not self._flushing \
+                and getattr(clause, 'is_select', False):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+# Extensions are bound to an app in create_app, so importing this module builds no engines or threads
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate()
+bootstrap = Bootstrap5()
+
+# Scheduled jobs run in the `flask jobs` worker; set RUN_SCHEDULER_IN_WEB=1 to run them in-process instead
 scheduler = APScheduler()
-scheduler.init_app(app)
-scheduler.start()
+
+# Staff-facing pages, reports and exports, the JSON API, and request instrumentation with /metrics
+main = Blueprint('main', __name__)
+reports = Blueprint('reports', __name__)
+API_PREFIX = '/api/v1'
+api = Blueprint('api', __name__, url_prefix=API_PREFIX)
+ops = Blueprint('ops', __name__)
+commands = Blueprint('commands', __name__, cli_group=None)
 
 class LLC(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -38,6 +149,8 @@ class Property(db.Model):
     name = db.Column(db.String(100), nullable=False)
     address = db.Column(db.String(200), nullable=False)
     llc_id = db.Column(db.Integer, db.ForeignKey('llc.id'), nullable=False)
+    # Bumped on every write to the property's units, expenses, payables or payments; keys the fragment cache
+    cache_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     units = db.relationship('Unit', backref='property', lazy=True)
     expenses = db.relationship('Expense', backref='property', lazy=True)
     payables = db.relationship('Payable', backref='property', lazy=True)
@@ -61,6 +174,10 @@ class PaymentMethod(db.Model):
     card_type = db.Column(db.String(20), nullable=True)  # Visa, Amex, Mastercard, etc.
 
 class Expense(db.Model):
+    __table_args__ = (
+        db.Index('ix_expense_property_date_paid', 'property_id', 'date_paid'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -82,6 +199,10 @@ PAYMENT_METHOD_TYPES = ['Cash', 'Credit Card', 'Check']
 CARD_TYPES = ['Visa', 'Mastercard', 'Amex', 'Discover']
 
 class Payable(db.Model):
+    __table_args__ = (
+        db.Index('ix_payable_property_due_date', 'property_id', 'due_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -91,10 +212,22 @@ class Payable(db.Model):
     property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=False)
     paid = db.Column(db.Boolean, default=False)
 
+# Notes of the late fee charge written by the assess_late_fees job
+ASSESSED_LATE_FEE_NOTE = 'Late fee assessed'
+
+def _billing_period_default(context):
+    return context.get_current_parameters()['due_date'].replace(day=1)
+
 class RentPayment(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('unit_id', 'billing_period', name='uq_rent_payment_unit_period'),
+        db.Index('ix_rent_payment_unit_due_date', 'unit_id', 'due_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     unit_id = db.Column(db.Integer, db.ForeignKey('unit.id'), nullable=False)
     due_date = db.Column(db.Date, nullable=False)
+    billing_period = db.Column(db.Date, nullable=False, default=_billing_period_default)  # First day of the billed month
     amount = db.Column(db.Float, nullable=False)
     paid_date = db.Column(db.Date, nullable=True)
     paid_amount = db.Column(db.Float, nullable=True)
@@ -103,48 +236,616 @@ class RentPayment(db.Model):
     unit = db.relationship('Unit', back_populates='rent_payments')
     transactions = db.relationship('PaymentTransaction', back_populates='rent_payment', cascade='all, delete-orphan')
 
-    @property
+    # The SQL side of these hybrids aggregates PaymentTransaction rows, so use them in
+    # a query joined to the transactions and grouped by RentPayment.id (see with_totals).
+    # Charges (late fees) add to what is owed; every other transaction is a payment.
+    @hybrid_property
     def total_paid(self):
-        return sum(transaction.amount for transaction in self.transactions)
+        return sum(transaction.amount for transaction in self.transactions if not transaction.is_charge)
 
-    @property
+    @total_paid.expression
+    def total_paid(cls):
+        return func.coalesce(func.sum(case((PaymentTransaction.is_charge, 0), else_=PaymentTransaction.amount)), 0)
+
+    @hybrid_property
+    def late_fee_total(self):
+        return sum(transaction.amount for transaction in self.transactions if transaction.is_charge)
+
+    @late_fee_total.expression
+    def late_fee_total(cls):
+        return func.coalesce(func.sum(case((PaymentTransaction.is_charge, PaymentTransaction.amount), else_=0)), 0)
+
+    @hybrid_property
     def balance_due(self):
-        return self.amount - self.total_paid
+        return self.amount + self.late_fee_total - self.total_paid
+
+    @classmethod
+    def with_totals(cls):
+        """Query (RentPayment, total_paid, late_fee_total, balance_due) rows in one grouped query."""
+        return db.session.query(cls, cls.total_paid, cls.late_fee_total, cls.balance_due)\
+            .outerjoin(cls.transactions)\
+            .group_by(cls.id)
 
     @property
     def is_fully_paid(self):
-        return self.total_paid >= self.amount
+        return self.balance_due <= 0
 
 class PaymentTransaction(db.Model):
+    __table_args__ = (
+        db.Index('ix_payment_transaction_rent_payment_date', 'rent_payment_id', 'payment_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     rent_payment_id = db.Column(db.Integer, db.ForeignKey('rent_payment.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     payment_date = db.Column(db.Date, nullable=False)
     payment_method = db.Column(db.String(50), nullable=False)  # e.g., 'Cash', 'Check', 'Credit Card'
     notes = db.Column(db.Text, nullable=True)
+    # True for amounts charged to the renter (late fees), which are owed rather than received
+    is_charge = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     rent_payment = db.relationship('RentPayment', back_populates='transactions')
 
+class PropertyFinancialSummary(db.Model):
+    # Running monthly totals per property, kept in step with Expense and PaymentTransaction writes
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), primary_key=True, autoincrement=False)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    month = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_expenses = db.Column(db.Float, nullable=False, default=0)
+    total_income = db.Column(db.Float, nullable=False, default=0)
+
+_FINANCIAL_ATTRIBUTES = (
+    Expense.property_id, Expense.date_paid, Expense.amount,
+    PaymentTransaction.rent_payment_id, PaymentTransaction.payment_date, PaymentTransaction.amount,
+    PaymentTransaction.is_charge,
+)
+for _attribute in _FINANCIAL_ATTRIBUTES:
+    # Load the old value on assignment so edits to expired objects still carry their history
+    event.listen(_attribute, 'set', lambda *args: None,
+                 active_history=True)
+
+def upsert(connection, table, rows, key_columns, update):
+    """Insert `rows`, applying `update(incoming)` -> {column: expression} where a key already exists."""
+    if connection.dialect.name == 'sqlite':
+        stmt = sqlite_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(index_elements=key_columns, set_=update(stmt.excluded))
+    else:
+        stmt = mysql_insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(**update(stmt.inserted))
+    connection.execute(stmt)
+
+def _previous_value(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(obj, attr)
+
+def _financial_changes(obj, sign=1, previous=False):
+    """Return the (owner_id, date, amount) triple an Expense or PaymentTransaction contributes."""
+    value = _previous_value if previous else getattr
+    # Ids assigned straight from form data are still strings until the session is refreshed
+    if isinstance(obj, Expense):
+        return int(value(obj, 'property_id')), value(obj, 'date_paid'), sign * value(obj, 'amount')
+    # Charges are owed rather than received, so they are not income
+    amount = 0 if value(obj, 'is_charge') else sign * value(obj, 'amount')
+    return int(value(obj, 'rent_payment_id')), value(obj, 'payment_date'), amount
+
+def apply_financial_deltas(connection, deltas):
+    """Add {(property_id, year, month): [expenses, income]} deltas to the summary table."""
+    table = PropertyFinancialSummary.__table__
+    rows = [
+        {'property_id': property_id, 'year': year, 'month': month,
+         'total_expenses': expenses, 'total_income': income}
+        for (property_id, year, month), (expenses, income) in deltas.items()
+        if expenses or income
+    ]
+    if not rows:
+        return
+
+    for year in {row['year'] for row in rows}:
+        tax_rollup_cache.pop(year, None)
+    upsert(connection, table, rows, ['property_id', 'year', 'month'], lambda incoming: {
+        'total_expenses': table.c.total_expenses + incoming.total_expenses,
+        'total_income': table.c.total_income + incoming.total_income
+    })
+
+@event.listens_for(db.session, 'after_flush')
+def update_financial_summary(session, flush_context):
+    """Fold every flushed Expense/PaymentTransaction insert, edit or delete into the summary table."""
+    expense_changes = []
+    income_changes = []
+    deleted_rent_payments = {}
+
+    def track(obj, sign, previous=False):
+        changes = expense_changes if isinstance(obj, Expense) else income_changes
+        changes.append(_financial_changes(obj, sign, previous))
+
+    for obj in session.new:
+        if isinstance(obj, (Expense, PaymentTransaction)):
+            track(obj, 1)
+    for obj in session.deleted:
+        if isinstance(obj, (Expense, PaymentTransaction)):
+            track(obj, -1, previous=True)
+        elif isinstance(obj, RentPayment):
+            deleted_rent_payments[obj.id] = _previous_value(obj, 'unit_id')
+    for obj in session.dirty:
+        if isinstance(obj, (Expense, PaymentTransaction)) and session.is_modified(obj):
+            # An edit may move the amount to another property or month; reverse the old row first
+            track(obj, -1, previous=True)
+            track(obj, 1)
+            if isinstance(obj, Expense):
+                # A category change nets to zero here but still moves totals in the tax rollup
+                for day in (_previous_value(obj, 'date_paid'), obj.date_paid):
+                    tax_rollup_cache.pop(day.year, None)
+        elif isinstance(obj, (Property, LLC)) and session.is_modified(obj):
+            # A property moved to another LLC, or a rename, changes every year's rollup
+            tax_rollup_cache.clear()
+
+    if not expense_changes and not income_changes:
+        return
+
+    connection = session.connection()
+    property_ids = {}
+    rent_payment_ids = {rent_payment_id for rent_payment_id, _, _ in income_changes}
+    if rent_payment_ids:
+        property_ids = dict(connection.execute(
+            select(RentPayment.id, Unit.property_id)
+            .join(Unit, Unit.id == RentPayment.unit_id)
+            .where(RentPayment.id.in_(rent_payment_ids))
+        ).all())
+        deleted_unit_ids = {unit_id for rent_payment_id, unit_id in deleted_rent_payments.items()
+                            if rent_payment_id not in property_ids}
+        if deleted_unit_ids:
+            unit_properties = dict(connection.execute(
+                select(Unit.id, Unit.property_id).where(Unit.id.in_(deleted_unit_ids))
+            ).all())
+            for rent_payment_id, unit_id in deleted_rent_payments.items():
+                property_ids.setdefault(rent_payment_id, unit_properties.get(unit_id))
+
+    deltas = defaultdict(lambda: [0, 0])
+    for property_id, day, amount in expense_changes:
+        deltas[(property_id, day.year, day.month)][0] += amount
+    for rent_payment_id, day, amount in income_changes:
+        property_id = property_ids.get(rent_payment_id)
+        if property_id is not None:
+            deltas[(property_id, day.year, day.month)][1] += amount
+    apply_financial_deltas(connection, deltas)
+
+def financial_summary_totals():
+    """Compute {(property_id, year, month): [expenses, income]} from the expense and payment tables."""
+    year = func.extract('year', Expense.date_paid)
+    month = func.extract('month', Expense.date_paid)
+    expense_totals = db.session.query(Expense.property_id, year, month, func.sum(Expense.amount))\
+        .group_by(Expense.property_id, year, month)
+
+    year = func.extract('year', PaymentTransaction.payment_date)
+    month = func.extract('month', PaymentTransaction.payment_date)
+    income_totals = db.session.query(Unit.property_id, year, month, func.sum(PaymentTransaction.amount))\
+        .select_from(PaymentTransaction).join(RentPayment).join(Unit)\
+        .filter(~PaymentTransaction.is_charge)\
+        .group_by(Unit.property_id, year, month)
+
+    totals = defaultdict(lambda: [0, 0])
+    for property_id, year, month, total in expense_totals:
+        totals[(property_id, int(year), int(month))][0] += total
+    for property_id, year, month, total in income_totals:
+        totals[(property_id, int(year), int(month))][1] += total
+    return totals
+
+def rebuild_financial_summary():
+    """Recompute the whole summary table from the expense and payment transaction tables."""
+    deltas = financial_summary_totals()
+    db.session.query(PropertyFinancialSummary).delete()
+    apply_financial_deltas(db.session.connection(), deltas)
+    db.session.execute(update(Property.__table__).values(cache_version=Property.__table__.c.cache_version + 1))
+    db.session.commit()
+    return len(deltas)
+
+def financial_summary_mismatches(tolerance=0.005):
+    """Return (key, stored, expected) for every summary row that differs from a rebuild."""
+    expected = financial_summary_totals()
+    stored = {(row.property_id, row.year, row.month): [row.total_expenses, row.total_income]
+              for row in PropertyFinancialSummary.query}
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        stored_totals, expected_totals = stored.get(key, [0, 0]), expected.get(key, [0, 0])
+        if any(abs(a - b) > tolerance for a, b in zip(stored_totals, expected_totals)):
+            mismatches.append((key, stored_totals, expected_totals))
+    return mismatches
+
+@commands.cli.command('rebuild-financial-summary')
+@click.option('--check', is_flag=True, help='Only compare the summary table with a rebuild; exit 1 if they differ.')
+def rebuild_financial_summary_command(check):
+    """Recompute the per-property monthly financial summary from scratch."""
+    if not check:
+        click.echo(f"Rebuilt {rebuild_financial_summary()} property/month summary rows.")
+        return
+    mismatches = financial_summary_mismatches()
+    for (property_id, year, month), stored, expected in mismatches:
+        click.echo(f"property {property_id} {year}-{month:02d}: expenses {stored[0]:.2f} vs {expected[0]:.2f}, "
+                   f"income {stored[1]:.2f} vs {expected[1]:.2f}")
+    if mismatches:
+        raise click.ClickException(f"{len(mismatches)} summary rows differ from a rebuild.")
+    click.echo('The financial summary matches a rebuild.')
+
+class Vendor(db.Model):
+    # One row per distinct vendor name, kept up to date from Expense and Payable writes
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    normalized_name = db.Column(db.String(100), nullable=False, unique=True)
+    use_count = db.Column(db.Integer, nullable=False, default=0)
+    last_used = db.Column(db.Date, nullable=True)
+
+def normalize_vendor(name):
+    return ' '.join(name.lower().split())
+
+@event.listens_for(db.session, 'after_flush')
+def record_vendor_usage(session, flush_context):
+    """Count each saved Expense/Payable against its vendor in the vendor table."""
+    usage = {}
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, (Expense, Payable)) or not obj.vendor:
+            continue
+        if obj in session.dirty and not inspect(obj).attrs.vendor.history.has_changes():
+            continue
+        normalized = normalize_vendor(obj.vendor)
+        name, count = usage.get(normalized, (obj.vendor.strip(), 0))
+        usage[normalized] = (name, count + 1)
+    apply_vendor_usage(session, usage)
+
+def apply_vendor_usage(session, usage):
+    """Add {normalized_name: (name, count)} uses to the vendor table."""
+    if not usage:
+        return
+    table = Vendor.__table__
+    today = datetime.now().date()
+    rows = [{'name': name, 'normalized_name': normalized, 'use_count': count, 'last_used': today}
+            for normalized, (name, count) in usage.items()]
+    upsert(session.connection(), table, rows, ['normalized_name'], lambda incoming: {
+        'use_count': table.c.use_count + incoming.use_count,
+        'last_used': incoming.last_used
+    })
+    session.info['vendors_changed'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def refresh_vendor_index(session):
+    if session.info.pop('vendors_changed', False):
+        vendor_index.invalidate()
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_vendor_changes(session):
+    session.info.pop('vendors_changed', None)
+
+def load_vendors():
+    return db.session.query(Vendor.name, Vendor.use_count, Vendor.last_used).all()
+
+vendor_index = VendorIndex(load_vendors)
+
+# Rendered property and unit page sections; set FRAGMENT_CACHE_DIR to share them between workers on a host
+fragment_cache = FragmentCache(max_entries=int(os.getenv('FRAGMENT_CACHE_ENTRIES', 512)),
+                               directory=os.getenv('FRAGMENT_CACHE_DIR') or None)
+
+def code_fingerprint():
+    """Hash this module and the templates, so on-disk fragments from an older release are never served."""
+    base = os.path.dirname(os.path.abspath(__file__))
+    paths = [os.path.abspath(__file__)]
+    for root, _, files in os.walk(os.path.join(base, 'templates')):
+        paths.extend(os.path.join(root, name) for name in files)
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        digest.update(path[len(base):].encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+FRAGMENT_RELEASE = code_fingerprint()
+
+def bump_property_versions(connection, property_ids=(), unit_ids=(), rent_payment_ids=()):
+    """Increment cache_version for properties owning any of the given rows, in one UPDATE."""
+    property_ids, unit_ids, rent_payment_ids = set(property_ids), set(unit_ids), set(rent_payment_ids)
+    property_ids.discard(None)
+    conditions = []
+    if property_ids:
+        conditions.append(Property.id.in_(property_ids))
+    if unit_ids or rent_payment_ids:
+        owned_units = select(Unit.property_id).where(or_(
+            Unit.id.in_(unit_ids),
+            Unit.id.in_(select(RentPayment.unit_id).where(RentPayment.id.in_(rent_payment_ids)))
+        ))
+        conditions.append(Property.id.in_(owned_units))
+    if conditions:
+        connection.execute(update(Property.__table__).where(or_(*conditions))
+                           .values(cache_version=Property.__table__.c.cache_version + 1))
+
+@event.listens_for(db.session, 'after_flush')
+def invalidate_property_fragments(session, flush_context):
+    """Bump the version of every property whose units, expenses, payables or payments were written."""
+    property_ids, unit_ids, rent_payment_ids = set(), set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, (Unit, Expense, Payable)):
+            # Cover both the old and the new owner when a row moves between properties
+            property_ids.update({obj.property_id, _previous_value(obj, 'property_id')})
+        elif isinstance(obj, RentPayment):
+            unit_ids.update({obj.unit_id, _previous_value(obj, 'unit_id')})
+        elif isinstance(obj, PaymentTransaction):
+            rent_payment_ids.update({obj.rent_payment_id, _previous_value(obj, 'rent_payment_id')})
+    bump_property_versions(session.connection(), property_ids, unit_ids - {None}, rent_payment_ids - {None})
+
+def cached_fragment(property, section, render):
+    """Return `render()`'s HTML for a page section, reusing it until the property's next write."""
+    key = f"property:{property.id}:v{property.cache_version}:{FRAGMENT_RELEASE}:{section}"
+    html = fragment_cache.get(key)
+    if html is None:
+        html = render()
+        fragment_cache.set(key, html)
+    return Markup(html)
+
 def create_initial_payment_methods():
-    with app.app_context():
-        if PaymentMethod.query.count() == 0:
-            default_methods = [
-                PaymentMethod(method_type='Cash', description='Cash'),
-                PaymentMethod(method_type='Credit Card', description='Visa Card', card_type='Visa', card_number='1234'),
-                PaymentMethod(method_type='Credit Card', description='Mastercard', card_type='Mastercard', card_number='5678'),
-            ]
-            db.session.bulk_save_objects(default_methods)
-            db.session.commit()
-            print("Initial payment methods created.")
-        else:
-            print("Payment methods already exist.")
+    if PaymentMethod.query.count() == 0:
+        default_methods = [
+            PaymentMethod(method_type='Cash', description='Cash'),
+            PaymentMethod(method_type='Credit Card', description='Visa Card', card_type='Visa', card_number='1234'),
+            PaymentMethod(method_type='Credit Card', description='Mastercard', card_type='Mastercard', card_number='5678'),
+        ]
+        db.session.bulk_save_objects(default_methods)
+        db.session.commit()
+        print("Initial payment methods created.")
+    else:
+        print("Payment methods already exist.")
+
+
+READ_PRIMARY_COOKIE = 'read_primary_until'
+REPLICA_LAG_CHECK_SECONDS = 5
+
+_replica_status = {'checked_at': None, 'current': False}
+
+def primary_only(view):
+    """Mark a GET view that writes, so none of its reads are routed to the replica."""
+    view.primary_only = True
+    return view
+
+def is_primary_only(view):
+    return getattr(view, 'primary_only', False)
+
+def replica_lag_seconds():
+    """Return the replica's replication lag in seconds, or None if it is unknown or stopped."""
+    try:
+        with db.engines['replica'].connect() as connection:
+            for statement in ('SHOW REPLICA STATUS', 'SHOW SLAVE STATUS'):
+                try:
+                    status = connection.exec_driver_sql(statement).mappings().first()
+                    break
+                except SQLAlchemyError:
+                    status = None
+    except SQLAlchemyError:
+        return None
+    if status is None:
+        return None
+    return status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+
+def replica_is_current():
+    # Lag is measured at most every REPLICA_LAG_CHECK_SECONDS per process
+    now = time.monotonic()
+    checked_at = _replica_status['checked_at']
+    if checked_at is None or now - checked_at >= REPLICA_LAG_CHECK_SECONDS:
+        lag = replica_lag_seconds()
+        _replica_status['current'] = lag is not None and lag <= current_app.config['REPLICA_MAX_LAG_SECONDS']
+        _replica_status['checked_at'] = now
+    return _replica_status['current']
+
+def use_read_replica():
+    if 'replica' not in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        return False
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    if view is None or is_primary_only(view):
+        return False
+    # Read-after-write: stay on the primary for a while after this browser changed something
+    try:
+        if float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time():
+            return False
+    except ValueError:
+        pass
+    return replica_is_current()
+
+@ops.before_app_request
+def route_reads():
+    db.session.info['read_replica'] = use_read_replica()
+
+@ops.after_app_request
+def remember_write(response):
+    # primary_only views write even on GET, and usually redirect to a page read from the replica
+    wrote = request.method not in ('GET', 'HEAD', 'OPTIONS') \
+        or is_primary_only(current_app.view_functions.get(request.endpoint))
+    if wrote and response.status_code < 400 and 'replica' in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        sticky_seconds = current_app.config['REPLICA_STICKY_SECONDS']
+        response.set_cookie(READ_PRIMARY_COOKIE, str(time.time() + sticky_seconds),
+                            max_age=int(sticky_seconds) + 1, httponly=True, samesite='Lax')
+    return response
+
+SLOWEST_QUERIES_KEPT = 5
+
+class QueryStats:
+    """SQL statements issued while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = defaultdict(int)  # SQL text -> executions
+        self.slowest = []  # (seconds, SQL text), longest first
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+        if len(self.slowest) < SLOWEST_QUERIES_KEPT or seconds > self.slowest[-1][0]:
+            self.slowest.append((seconds, statement))
+            self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+            del self.slowest[SLOWEST_QUERIES_KEPT:]
 
+    def repeated(self, threshold):
+        # The same parameterised statement run many times is usually a lazy load inside a loop
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
 
-@app.route('/')
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    if has_request_context() and 'query_stats' in g:
+        g.query_stats.record(statement, time.perf_counter() - started)
+
+@event.listens_for(Engine, 'handle_error')
+def discard_query_timer(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+@ops.before_app_request
+def start_query_stats():
+    g.query_stats = QueryStats()
+
+@ops.after_app_request
+def report_query_stats(response):
+    stats = g.get('query_stats')
+    if stats is None:
+        return response
+    db_ms = stats.seconds * 1000
+    repeated = stats.repeated(current_app.config['REPEATED_QUERY_THRESHOLD'])
+    response.headers['X-DB-Query-Count'] = str(stats.count)
+    response.headers['X-DB-Time-Ms'] = f'{db_ms:.1f}'
+    if repeated:
+        response.headers['X-DB-Repeated-Queries'] = str(len(repeated))
+    # Shows up in the browser's network panel next to the request timings
+    response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{stats.count} queries"')
+
+    config = current_app.config
+    if stats.count > config['QUERY_COUNT_BUDGET'] or db_ms > config['QUERY_TIME_BUDGET_MS']:
+        current_app.logger.warning('%s %s over query budget: %d queries, %.1f ms in the database; slowest: %s',
+                           request.method, request.path, stats.count, db_ms,
+                           '; '.join(f'{seconds * 1000:.1f} ms {" ".join(statement.split())[:200]}'
+                                     for seconds, statement in stats.slowest))
+    for statement, count in repeated.items():
+        current_app.logger.warning('%s %s suspected N+1: %d executions of %s', request.method, request.path,
+                           count, ' '.join(statement.split())[:300])
+    return response
+
+@ops.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+
+@ops.after_app_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@ops.teardown_app_request
+def record_request_metrics(exception):
+    # Runs after streamed responses finish, and for requests that raised
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    REQUESTS_IN_FLIGHT.dec()
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+    REQUESTS.inc(endpoint=endpoint, method=request.method,
+                 status=500 if exception is not None else g.get('response_status', 500))
+
+def add_months(value, months):
+    """Return the first day of the month `months` after the month of `value`."""
+    month_index = value.month - 1 + months
+    return date(value.year + month_index // 12, month_index % 12 + 1, 1)
+
+def period_bounds(year, month=None):
+    """Return the half-open [start, end) date range covering a year or a single month."""
+    if month is None:
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    start = date(year, month, 1)
+    return start, add_months(start, 1)
+
+PAGE_SIZE = 50
+
+def keyset_page(query, id_column, date_column=None, cursor=None, descending=False, page_size=PAGE_SIZE):
+    """Return one page of `query` ordered by (date_column, id_column) and the cursor for the next page.
+
+    Cursors look like '2024-05-01:123' (or just '123' without a date column) and
+    are compared against the sort key instead of using OFFSET, so every page costs
+    the same index range scan. The next cursor is None on the last page.
+    """
+    if cursor:
+        try:
+            if date_column is None:
+                last_id = int(cursor)
+                query = query.filter(id_column < last_id if descending else id_column > last_id)
+            else:
+                day, _, last_id = cursor.partition(':')
+                day, last_id = datetime.strptime(day, '%Y-%m-%d').date(), int(last_id)
+                if descending:
+                    query = query.filter(or_(date_column < day, and_(date_column == day, id_column < last_id)))
+                else:
+                    query = query.filter(or_(date_column > day, and_(date_column == day, id_column > last_id)))
+        except ValueError:
+            abort(400)
+
+    order_by = [id_column] if date_column is None else [date_column, id_column]
+    if descending:
+        order_by = [column.desc() for column in order_by]
+    items = query.order_by(*order_by).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = str(last.id) if date_column is None else \
+            f"{getattr(last, date_column.key).isoformat()}:{last.id}"
+    return items, next_cursor
+
+def property_units_page(property_id, cursor=None):
+    return keyset_page(Unit.query.filter_by(property_id=property_id), Unit.id, cursor=cursor)
+
+def property_payables_page(property_id, cursor=None):
+    return keyset_page(Payable.query.filter_by(property_id=property_id), Payable.id,
+                       Payable.due_date, cursor=cursor)
+
+def property_expenses_page(property_id, cursor=None):
+    # Newest expenses first
+    return keyset_page(Expense.query.filter_by(property_id=property_id), Expense.id,
+                       Expense.date_paid, cursor=cursor, descending=True)
+
+def render_page(template, items_name, page):
+    items, next_cursor = page
+    response = make_response(render_template(template, **{items_name: items}))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def unit_rollup_columns():
+    """Aggregate columns describing the units joined into a grouped query."""
+    return (
+        func.count(Unit.id).label('unit_count'),
+        func.coalesce(func.sum(case((Unit.renter_name != '', 1), else_=0)), 0).label('occupied_units'),
+        func.coalesce(func.sum(Unit.rent_amount), 0).label('rent_roll'),
+    )
+
+@main.route('/')
 def index():
-    llcs = LLC.query.all()
+    # Counts and rent roll for every LLC in one grouped query
+    llcs = db.session.query(
+        LLC.id,
+        LLC.name,
+        func.count(func.distinct(Property.id)).label('property_count'),
+        *unit_rollup_columns()
+    ).outerjoin(Property, Property.llc_id == LLC.id)\
+        .outerjoin(Unit, Unit.property_id == Property.id)\
+        .group_by(LLC.id, LLC.name)\
+        .order_by(LLC.id)\
+        .all()
     return render_template('index.html', llcs=llcs)
 
-@app.route('/llc/add', methods=['GET', 'POST'])
+@main.route('/llc/add', methods=['GET', 'POST'])
 def add_llc():
     if request.method == 'POST':
         name = request.form['name']
@@ -152,15 +853,25 @@ def add_llc():
         db.session.add(new_llc)
         db.session.commit()
         flash('LLC added successfully!', 'success')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     return render_template('add_llc.html')
 
-@app.route('/llc/<int:llc_id>')
+@main.route('/llc/<int:llc_id>')
 def llc_detail(llc_id):
     llc = LLC.query.get_or_404(llc_id)
-    return render_template('llc_detail.html', llc=llc)
+    properties = db.session.query(
+        Property.id,
+        Property.name,
+        Property.address,
+        *unit_rollup_columns()
+    ).outerjoin(Unit, Unit.property_id == Property.id)\
+        .filter(Property.llc_id == llc_id)\
+        .group_by(Property.id, Property.name, Property.address)\
+        .order_by(Property.id)\
+        .all()
+    return render_template('llc_detail.html', llc=llc, properties=properties)
 
-@app.route('/property/add/<int:llc_id>', methods=['GET', 'POST'])
+@main.route('/property/add/<int:llc_id>', methods=['GET', 'POST'])
 def add_property(llc_id):
     if request.method == 'POST':
         name = request.form['name']
@@ -169,29 +880,16 @@ def add_property(llc_id):
         db.session.add(new_property)
         db.session.commit()
         flash('Property added successfully!', 'success')
-        return redirect(url_for('llc_detail', llc_id=llc_id))
+        return redirect(url_for('main.llc_detail', llc_id=llc_id))
     return render_template('add_property.html', llc_id=llc_id)
 
-@app.route('/property/<int:property_id>', methods=['GET', 'POST'])
+@main.route('/property/<int:property_id>', methods=['GET', 'POST'])
 def property_detail(property_id):
     property = Property.query.get_or_404(property_id)
     credit_cards = PaymentMethod.query.filter_by(method_type='Credit Card').all()
 
     current_year = datetime.now().year
-    total_expenses = db.session.query(func.sum(Expense.amount)).filter(
-        Expense.property_id == property_id,
-        func.extract('year', Expense.date_paid) == current_year
-    ).scalar() or 0
-
-    # Calculate total income (rent paid) for the current year
-    total_income = db.session.query(func.sum(PaymentTransaction.amount)).join(RentPayment).join(Unit).filter(
-        Unit.property_id == property_id,
-        func.extract('year', PaymentTransaction.payment_date) == current_year
-    ).scalar() or 0
-
-    # Calculate net income
-    net_income = total_income - total_expenses
-    
+
     if request.method == 'POST':
         if 'add_payable' in request.form:
             new_payable = Payable(
@@ -226,19 +924,160 @@ def property_detail(property_id):
             db.session.commit()
             flash('Expense added successfully!', 'success')
         
-        return redirect(url_for('property_detail', property_id=property_id))
+        return redirect(url_for('main.property_detail', property_id=property_id))
     
+    # Each section's queries only run when its cached fragment is stale
+    def render_summary():
+        total_expenses, total_income = db.session.query(
+            func.coalesce(func.sum(PropertyFinancialSummary.total_expenses), 0),
+            func.coalesce(func.sum(PropertyFinancialSummary.total_income), 0)
+        ).filter(
+            PropertyFinancialSummary.property_id == property_id,
+            PropertyFinancialSummary.year == current_year
+        ).one()
+        return render_template('property_summary.html', current_year=current_year,
+                               total_expenses=total_expenses, total_income=total_income,
+                               net_income=total_income - total_expenses)
+
+    def cached_section(template, items_name, page):
+        def render():
+            items, cursor = page(property_id)
+            return render_template(template, property=property, cursor=cursor, **{items_name: items})
+        return cached_fragment(property, items_name, render)
+
     return render_template('property_detail.html', 
                            property=property, 
+                           summary=cached_fragment(property, f'summary:{current_year}', render_summary),
+                           units_table=cached_section('property_units.html', 'units', property_units_page),
+                           payables_table=cached_section('property_payables.html', 'payables',
+                                                         property_payables_page),
+                           expenses_table=cached_section('property_expenses.html', 'expenses',
+                                                         property_expenses_page),
                            categories=EXPENSE_CATEGORIES, 
                            payment_method_types=PAYMENT_METHOD_TYPES, 
+                           credit_cards=credit_cards)
+
+@main.route('/property/<int:property_id>/units')
+def property_units(property_id):
+    return render_page('unit_rows.html', 'units',
+                       property_units_page(property_id, request.args.get('cursor')))
+
+@main.route('/property/<int:property_id>/payables')
+def property_payables(property_id):
+    return render_page('payable_rows.html', 'payables',
+                       property_payables_page(property_id, request.args.get('cursor')))
+
+@main.route('/property/<int:property_id>/expenses')
+def property_expenses(property_id):
+    return render_page('expense_rows.html', 'expenses',
+                       property_expenses_page(property_id, request.args.get('cursor')))
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_PREVIEW_ROWS = 20
+IMPORT_MAX_REPORTED_ERRORS = 200
+
+def insert_expense_batch(rows):
+    """Bulk-insert expense rows and commit, keeping the summary and vendor tables in step.
+
+    Core inserts bypass the ORM flush hooks, so their deltas are applied here.
+    """
+    db.session.execute(insert(Expense.__table__), rows)
+
+    deltas = defaultdict(lambda: [0, 0])
+    usage = {}
+    for row in rows:
+        deltas[(row['property_id'], row['date_paid'].year, row['date_paid'].month)][0] += row['amount']
+        normalized = normalize_vendor(row['vendor'])
+        name, count = usage.get(normalized, (row['vendor'].strip(), 0))
+        usage[normalized] = (name, count + 1)
+    apply_financial_deltas(db.session.connection(), deltas)
+    apply_vendor_usage(db.session, usage)
+    bump_property_versions(db.session.connection(), {row['property_id'] for row in rows})
+    db.session.commit()
+
+def import_expenses(records, defaults, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """Validate statement records and insert them in batches of `batch_size`, one transaction each.
+
+    Records are consumed as a stream, and only the current batch, a short preview
+    and the first IMPORT_MAX_REPORTED_ERRORS errors are kept in memory. With
+    `dry_run` nothing is written.
+    """
+    cards = {method.card_number[-4:]: method
+             for method in PaymentMethod.query.filter_by(method_type='Credit Card')
+             if method.card_number}
+    result = {'valid': 0, 'imported': 0, 'error_count': 0, 'errors': [], 'preview': []}
+    batch = []
+    for line_number, record in records:
+        try:
+            row = build_expense_row(record, defaults, cards)
+        except ValueError as exc:
+            result['error_count'] += 1
+            if len(result['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+                result['errors'].append((line_number, str(exc)))
+            continue
+
+        result['valid'] += 1
+        if len(result['preview']) < IMPORT_PREVIEW_ROWS:
+            result['preview'].append(row)
+        if dry_run:
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            insert_expense_batch(batch)
+            result['imported'] += len(batch)
+            batch = []
+
+    if batch:
+        insert_expense_batch(batch)
+        result['imported'] += len(batch)
+    return result
+
+@main.route('/property/<int:property_id>/import_expenses', methods=['GET', 'POST'])
+def import_property_expenses(property_id):
+    property = Property.query.get_or_404(property_id)
+    credit_cards = PaymentMethod.query.filter_by(method_type='Credit Card').all()
+    result = None
+
+    if request.method == 'POST':
+        upload = request.files.get('statement')
+        if not upload or not upload.filename:
+            flash('Choose a statement file to import.', 'error')
+            return redirect(url_for('main.import_property_expenses', property_id=property_id))
+
+        is_ofx = upload.filename.lower().endswith(('.ofx', '.qfx'))
+        defaults = {
+            'property_id': property_id,
+            'category': request.form['category'],
+            'categories': EXPENSE_CATEGORIES,
+            'payment_method_type': request.form['payment_method_type'],
+            'card': None,
+            # OFX amounts are signed from the account's side, so charges are negative
+            'charges_negative': is_ofx or 'charges_negative' in request.form,
+        }
+        if defaults['payment_method_type'] == 'Credit Card' and request.form.get('credit_card_id'):
+            defaults['card'] = PaymentMethod.query.get(int(request.form['credit_card_id']))
+        mapping = {field: request.form.get(f'{field}_column', '').strip()
+                   for field in ('date', 'description', 'amount', 'vendor', 'category', 'card', 'check_number')}
+
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', errors='replace', newline='')
+        records = iter_ofx_records(stream) if is_ofx else iter_csv_records(stream, mapping)
+        try:
+            result = import_expenses(records, defaults, dry_run='dry_run' in request.form)
+        except ValueError as exc:
+            flash(str(exc), 'error')
+            return redirect(url_for('main.import_property_expenses', property_id=property_id))
+        result['dry_run'] = 'dry_run' in request.form
+        if not result['dry_run']:
+            flash(f"Imported {result['imported']} expenses.", 'success')
+
+    return render_template('import_expenses.html',
+                           property=property,
+                           categories=EXPENSE_CATEGORIES,
+                           payment_method_types=PAYMENT_METHOD_TYPES,
                            credit_cards=credit_cards,
-                           total_expenses=total_expenses,
-                           total_income=total_income,
-                           net_income=net_income,
-                           current_year=current_year)
+                           result=result)
 
-@app.route('/unit/add/<int:property_id>', methods=['GET', 'POST'])
+@main.route('/unit/add/<int:property_id>', methods=['GET', 'POST'])
 def add_unit(property_id):
     property = Property.query.get_or_404(property_id)
     if request.method == 'POST':
@@ -254,10 +1093,10 @@ def add_unit(property_id):
         db.session.add(new_unit)
         db.session.commit()
         flash('Unit added successfully!', 'success')
-        return redirect(url_for('property_detail', property_id=property_id))
+        return redirect(url_for('main.property_detail', property_id=property_id))
     return render_template('add_unit.html', property=property)
 
-@app.route('/unit/edit/<int:unit_id>', methods=['GET', 'POST'])
+@main.route('/unit/edit/<int:unit_id>', methods=['GET', 'POST'])
 def edit_unit(unit_id):
     unit = Unit.query.get_or_404(unit_id)
     if request.method == 'POST':
@@ -269,24 +1108,24 @@ def edit_unit(unit_id):
         unit.rent_due_date = datetime.strptime(request.form['rent_due_date'], '%Y-%m-%d').date()
         db.session.commit()
         flash('Unit updated successfully!', 'success')
-        return redirect(url_for('property_detail', property_id=unit.property_id))
+        return redirect(url_for('main.property_detail', property_id=unit.property_id))
     return render_template('edit_unit.html', unit=unit)
 
-@app.route('/unit/delete/<int:unit_id>', methods=['POST'])
+@main.route('/unit/delete/<int:unit_id>', methods=['POST'])
 def delete_unit(unit_id):
     unit = Unit.query.get_or_404(unit_id)
     property_id = unit.property_id
     db.session.delete(unit)
     db.session.commit()
     flash('Unit deleted successfully!', 'success')
-    return redirect(url_for('property_detail', property_id=property_id))
+    return redirect(url_for('main.property_detail', property_id=property_id))
 
-@app.route('/payment_methods')
+@main.route('/payment_methods')
 def payment_methods():
     methods = PaymentMethod.query.all()
     return render_template('payment_methods.html', methods=methods)
 
-@app.route('/payment_method/add', methods=['GET', 'POST'])
+@main.route('/payment_method/add', methods=['GET', 'POST'])
 def add_payment_method():
     if request.method == 'POST':
         method_type = request.form['method_type']
@@ -306,15 +1145,15 @@ def add_payment_method():
         db.session.add(new_method)
         db.session.commit()
         flash('Payment method added successfully!', 'success')
-        return redirect(url_for('payment_methods'))
+        return redirect(url_for('main.payment_methods'))
     return render_template('add_payment_method.html', method_types=PAYMENT_METHOD_TYPES, card_types=CARD_TYPES)
 
-@app.route('/expense/<int:expense_id>')
+@main.route('/expense/<int:expense_id>')
 def expense_detail(expense_id):
     expense = Expense.query.get_or_404(expense_id)
     return render_template('expense_detail.html', expense=expense)
 
-@app.route('/expense/edit/<int:expense_id>', methods=['GET', 'POST'])
+@main.route('/expense/edit/<int:expense_id>', methods=['GET', 'POST'])
 def edit_expense(expense_id):
     expense = Expense.query.get_or_404(expense_id)
     credit_cards = PaymentMethod.query.filter_by(method_type='Credit Card').all()
@@ -343,7 +1182,7 @@ def edit_expense(expense_id):
 
         db.session.commit()
         flash('Expense updated successfully!', 'success')
-        return redirect(url_for('property_detail', property_id=expense.property_id))
+        return redirect(url_for('main.property_detail', property_id=expense.property_id))
 
     return render_template('edit_expense.html', 
                            expense=expense, 
@@ -351,7 +1190,7 @@ def edit_expense(expense_id):
                            payment_method_types=PAYMENT_METHOD_TYPES, 
                            credit_cards=credit_cards)
 
-@app.route('/payment_method/edit/<int:method_id>', methods=['GET', 'POST'])
+@main.route('/payment_method/edit/<int:method_id>', methods=['GET', 'POST'])
 def edit_payment_method(method_id):
     payment_method = PaymentMethod.query.get_or_404(method_id)
     
@@ -368,14 +1207,14 @@ def edit_payment_method(method_id):
         
         db.session.commit()
         flash('Payment method updated successfully!', 'success')
-        return redirect(url_for('payment_methods'))
+        return redirect(url_for('main.payment_methods'))
     
     return render_template('edit_payment_method.html', 
                            payment_method=payment_method, 
                            method_types=PAYMENT_METHOD_TYPES, 
                            card_types=CARD_TYPES)
 
-@app.route('/payment_method/delete/<int:method_id>', methods=['POST'])
+@main.route('/payment_method/delete/<int:method_id>', methods=['POST'])
 def delete_payment_method(method_id):
     payment_method = PaymentMethod.query.get_or_404(method_id)
     
@@ -386,26 +1225,23 @@ def delete_payment_method(method_id):
         db.session.commit()
         flash('Credit card deleted successfully.', 'success')
     
-    return redirect(url_for('payment_methods'))
+    return redirect(url_for('main.payment_methods'))
 
-@app.route('/vendor-suggestions')
+@main.route('/vendor-suggestions')
 def vendor_suggestions():
-    query = request.args.get('query', '').lower()
-    
-    # Query distinct vendors that match the input (case-insensitive)
-    vendors = db.session.query(Expense.vendor)\
-        .filter(func.lower(Expense.vendor).like(f"%{query}%"))\
-        .distinct()\
-        .order_by(Expense.vendor)\
-        .limit(10)\
-        .all()
-    
-    # Extract vendor names from the query result
-    suggestions = [vendor[0] for vendor in vendors]
-    
-    return jsonify(suggestions)
+    query = request.args.get('query', '')
+
+    # Served from the in-process vendor index, ranked by how often and how recently a vendor is used
+    suggestions = vendor_index.search(query)
+
+    response = jsonify(suggestions)
+    # Hash the body: the index generation is per process, so it can't tell workers' lists apart
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.max_age = vendor_index.ttl
+    return response.make_conditional(request)
 
-@app.route('/payable/<int:payable_id>/mark-as-paid', methods=['POST'])
+@main.route('/payable/<int:payable_id>/mark-as-paid', methods=['POST'])
 def mark_payable_as_paid(payable_id):
     payable = Payable.query.get_or_404(payable_id)
     
@@ -431,14 +1267,14 @@ def mark_payable_as_paid(payable_id):
     db.session.commit()
 
     flash('Payable marked as paid and converted to an expense.', 'success')
-    return redirect(url_for('property_detail', property_id=payable.property_id))
+    return redirect(url_for('main.property_detail', property_id=payable.property_id))
 
-@app.route('/unit/<int:unit_id>/rent_payments', methods=['GET', 'POST'])
+@main.route('/unit/<int:unit_id>/rent_payments', methods=['GET', 'POST'])
 def unit_rent_payments(unit_id):
     unit = Unit.query.get_or_404(unit_id)
     
     if request.method == 'POST':
-        rent_payment_id = request.form.get('rent_payment_id')
+        rent_payment_id = request.form.get('rent_payment_id', type=int)
         amount = float(request.form.get('amount'))
         payment_date = datetime.strptime(request.form.get('payment_date'), '%Y-%m-%d').date()
         payment_method = request.form.get('payment_method')
@@ -446,11 +1282,27 @@ def unit_rent_payments(unit_id):
         
         rent_payment = RentPayment.query.get(rent_payment_id)
         
-        # Calculate late fee
+        # Charge the late fee on the invoice's one charge row, raising any fee the nightly job assessed.
+        # Transactions are attached through the relationship so the loaded totals include them.
         late_fee = calculate_late_fee(rent_payment.due_date, payment_date, rent_payment.amount)
+        charge = next((transaction for transaction in rent_payment.transactions if transaction.is_charge), None)
+        if charge is None and late_fee > 0:
+            db.session.add(PaymentTransaction(
+                rent_payment=rent_payment,
+                amount=late_fee,
+                payment_date=payment_date,
+                payment_method='Late Fee',
+                notes=ASSESSED_LATE_FEE_NOTE,
+                is_charge=True
+            ))
+        elif charge is not None and late_fee > charge.amount:
+            charge.amount = late_fee
+        fees_paid = sum(transaction.amount for transaction in rent_payment.transactions
+                        if transaction.payment_method == 'Late Fee' and not transaction.is_charge)
+        late_fee = max(rent_payment.late_fee_total - fees_paid, 0)
         
         new_transaction = PaymentTransaction(
-            rent_payment_id=rent_payment_id,
+            rent_payment=rent_payment,
             amount=amount,
             payment_date=payment_date,
             payment_method=payment_method,
@@ -458,10 +1310,10 @@ def unit_rent_payments(unit_id):
         )
         db.session.add(new_transaction)
         
-        # If there's a late fee, add it as a separate transaction
+        # If there's a late fee, collect it as a separate transaction
         if late_fee > 0:
             late_fee_transaction = PaymentTransaction(
-                rent_payment_id=rent_payment_id,
+                rent_payment=rent_payment,
                 amount=late_fee,
                 payment_date=payment_date,
                 payment_method='Late Fee',
@@ -480,37 +1332,265 @@ def unit_rent_payments(unit_id):
         
         db.session.commit()
         flash('Payment transaction recorded successfully.', 'success')
-        return redirect(url_for('unit_rent_payments', unit_id=unit_id))
+        return redirect(url_for('main.unit_rent_payments', unit_id=unit_id))
     
-    rent_payments = RentPayment.query.filter_by(unit_id=unit_id).order_by(RentPayment.due_date.desc()).all()
-    return render_template('unit_rent_payments.html', unit=unit, rent_payments=rent_payments)
+    def render_payments():
+        # Totals come from one grouped query; transactions for the modals are batch-loaded in one more
+        rent_payments = RentPayment.with_totals()\
+            .filter(RentPayment.unit_id == unit_id)\
+            .options(selectinload(RentPayment.transactions))\
+            .order_by(RentPayment.due_date.desc())\
+            .all()
+        return render_template('unit_payments.html', rent_payments=rent_payments)
 
-@app.route('/generate_rent_payments/<int:property_id>')
+    payments = cached_fragment(unit.property, f'unit:{unit_id}:payments', render_payments)
+    return render_template('unit_rent_payments.html', unit=unit, payments=payments)
+
+@main.route('/generate_rent_payments/<int:property_id>', methods=['POST'])
+@primary_only
 def generate_rent_payments(property_id):
     property = Property.query.get_or_404(property_id)
-    current_date = datetime.now().date()
-    
-    for unit in property.units:
-        # Check if a rent payment already exists for the current month
-        existing_payment = RentPayment.query.filter(
-            RentPayment.unit_id == unit.id,
-            func.extract('year', RentPayment.due_date) == current_date.year,
-            func.extract('month', RentPayment.due_date) == current_date.month
-        ).first()
-        
-        if not existing_payment:
-            # Create a new rent payment for the current month
-            new_payment = RentPayment(
-                unit_id=unit.id,
-                due_date=datetime(current_date.year, current_date.month, unit.rent_due_date.day).date(),
-                amount=unit.rent_amount,
-                status='Unpaid'
-            )
-            db.session.add(new_payment)
-    
+    current_period = datetime.now().date().replace(day=1)
+
+    # A POSTed backfill range (start/end as YYYY-MM) is optional; otherwise the current month
+    try:
+        start_period = parse_billing_period(request.form.get('start')) or current_period
+        end_period = parse_billing_period(request.form.get('end')) or start_period
+    except ValueError:
+        flash('Backfill months must be in YYYY-MM format.', 'error')
+        return redirect(url_for('main.property_detail', property_id=property_id))
+    months = (end_period.year - start_period.year) * 12 + end_period.month - start_period.month + 1
+    if months > BACKFILL_MAX_MONTHS:
+        flash(f'Backfill at most {BACKFILL_MAX_MONTHS} months at a time; '
+              f'use `flask backfill-rent-payments` for longer ranges.', 'error')
+        return redirect(url_for('main.property_detail', property_id=property_id))
+
+    created, _ = backfill_rent_payments(start_period, end_period, property_id=property.id)
+    flash(f'Rent payments generated successfully ({created} created).', 'success')
+    return redirect(url_for('main.property_detail', property_id=property_id))
+
+BACKFILL_CHUNK_SIZE = 500
+BACKFILL_MAX_MONTHS = 36
+
+def parse_billing_period(value):
+    """Parse a 'YYYY-MM' string into the first day of that month; empty values give None."""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m').date()
+
+def backfill_rent_payments(start_period, end_period, property_id=None, llc_id=None,
+                           after_unit_id=0, chunk_size=BACKFILL_CHUNK_SIZE, progress=None):
+    """Create every missing RentPayment from start_period through end_period.
+
+    Units are scoped to a property, an LLC or the whole portfolio and processed in
+    id order, `chunk_size` units at a time, committing after each chunk. Returns
+    (created, last_unit_id); pass last_unit_id back as `after_unit_id` to resume
+    an interrupted run. Re-running a finished range creates nothing. `progress`, if
+    given, is called with (created, last_unit_id) after each committed chunk.
+    """
+    periods = []
+    period = start_period.replace(day=1)
+    while period <= end_period:
+        periods.append(period)
+        period = add_months(period, 1)
+
+    created = 0
+    last_unit_id = after_unit_id
+    if not periods:
+        return created, last_unit_id
+
+    while True:
+        unit_query = db.session.query(Unit.id, Unit.rent_amount, Unit.rent_due_date)\
+            .filter(Unit.id > last_unit_id)
+        if property_id is not None:
+            unit_query = unit_query.filter(Unit.property_id == property_id)
+        if llc_id is not None:
+            unit_query = unit_query.join(Property).filter(Property.llc_id == llc_id)
+        units = unit_query.order_by(Unit.id).limit(chunk_size).all()
+        if not units:
+            break
+
+        unit_ids = [unit.id for unit in units]
+        existing = set(db.session.query(RentPayment.unit_id, RentPayment.billing_period).filter(
+            RentPayment.unit_id.in_(unit_ids),
+            RentPayment.billing_period >= periods[0],
+            RentPayment.billing_period <= periods[-1]
+        ).all())
+
+        new_payments = [
+            {
+                'unit_id': unit.id,
+                'billing_period': period,
+                'due_date': rent_due_date_for(period, unit.rent_due_date.day),
+                'amount': unit.rent_amount,
+                'status': 'Unpaid'
+            }
+            for unit in units
+            for period in periods
+            if (unit.id, period) not in existing
+        ]
+        created += bulk_insert_rent_payments(new_payments)
+        db.session.commit()
+        last_unit_id = unit_ids[-1]
+        if progress:
+            progress(created, last_unit_id)
+
+    return created, last_unit_id
+
+@commands.cli.command('backfill-rent-payments')
+@click.option('--start', 'start', required=True, help='First month to backfill (YYYY-MM).')
+@click.option('--end', 'end', required=True, help='Last month to backfill (YYYY-MM).')
+@click.option('--property-id', type=int, help='Only backfill units of this property.')
+@click.option('--llc-id', type=int, help='Only backfill units of this LLC.')
+@click.option('--after-unit-id', type=int, default=0, help='Resume after this unit id.')
+@click.option('--chunk-size', type=int, default=BACKFILL_CHUNK_SIZE, show_default=True)
+def backfill_rent_payments_command(start, end, property_id, llc_id, after_unit_id, chunk_size):
+    """Create missing rent payments for a range of months."""
+    created, last_unit_id = backfill_rent_payments(
+        parse_billing_period(start), parse_billing_period(end),
+        property_id=property_id, llc_id=llc_id,
+        after_unit_id=after_unit_id, chunk_size=chunk_size,
+        progress=lambda created, last_unit_id: click.echo(f"  {created} created, resume after unit {last_unit_id}")
+    )
+    click.echo(f"Created {created} rent payments (last unit id {last_unit_id}).")
+
+SEED_VENDORS = [
+    'Con Edison', 'National Grid', 'City Water Department', 'Home Depot', "Lowe's", 'Ace Plumbing',
+    'Bright Electric', 'Green Lawn Care', 'Sparkle Cleaning', 'State Farm', 'County Tax Collector',
+    'Village Clerk', 'Miller & Co CPAs', 'Waste Management',
+]
+SEED_BATCH_SIZE = 5000
+
+def seed_portfolio(llcs=5, properties_per_llc=10, units_per_property=20, years=3, expenses_per_month=8,
+                   seed=None, progress=print):
+    """Fill the database with a synthetic portfolio for benchmarks and load tests.
+
+    Every unit is invoiced for each month of the last `years` years; most invoices
+    are paid on time, some late with a late fee, some partially or not at all.
+    Each property gets `expenses_per_month` expenses a month and a few open payables.
+    Rows are written with bulk inserts, then the financial summary is rebuilt.
+    """
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    first_period = add_months(today.replace(day=1), 1 - 12 * years)
+
+    properties = []
+    new_llcs = [LLC(name=f'Seed Holdings {llc_number} LLC') for llc_number in range(1, llcs + 1)]
+    for llc_number, llc in enumerate(new_llcs, 1):
+        for property_number in range(1, properties_per_llc + 1):
+            properties.append(Property(name=f'{llc_number}-{property_number} Main Street',
+                                       address=f'{rng.randint(1, 999)} Main Street, Springfield',
+                                       llc=llc))
+    db.session.add_all(new_llcs + properties)
+    db.session.flush()
+
+    unit_rows = [
+        {'property_id': property.id, 'unit_number': str(100 + unit_number),
+         'renter_name': f'Tenant {property.id}-{unit_number}', 'phone_number': f'555-{rng.randint(1000, 9999)}',
+         'email': f'tenant{property.id}.{unit_number}@example.com',
+         'rent_amount': float(rng.randrange(900, 3000, 25)),
+         'rent_due_date': first_period.replace(day=rng.choice([1, 1, 1, 5, 15]))}
+        for property in properties for unit_number in range(1, units_per_property + 1)
+    ]
+    for start in range(0, len(unit_rows), SEED_BATCH_SIZE):
+        db.session.execute(insert(Unit.__table__), unit_rows[start:start + SEED_BATCH_SIZE])
+    db.session.add_all(
+        Payable(property_id=property.id, description='Open invoice', amount=round(rng.uniform(50, 2500), 2),
+                due_date=today + timedelta(days=rng.randint(-10, 45)), category=rng.choice(EXPENSE_CATEGORIES),
+                vendor=rng.choice(SEED_VENDORS))
+        for property in properties for _ in range(3)
+    )
+    property_ids = [property.id for property in properties]
+    llc_ids = [llc.id for llc in new_llcs]
     db.session.commit()
-    flash('Rent payments generated successfully.', 'success')
-    return redirect(url_for('property_detail', property_id=property_id))
+    progress(f"Created {len(properties)} properties and {len(unit_rows)} units.")
+
+    invoiced = sum(backfill_rent_payments(first_period, today.replace(day=1), llc_id=llc_id)[0]
+                   for llc_id in llc_ids)
+    progress(f"Created {invoiced} rent payments.")
+
+    transactions = []
+    statuses = defaultdict(list)
+    paid = db.session.query(RentPayment.id, RentPayment.due_date, RentPayment.amount)\
+        .join(Unit).filter(Unit.property_id.in_(property_ids), RentPayment.due_date < today)
+    for rent_payment_id, due_date, amount in paid.yield_per(SEED_BATCH_SIZE):
+        roll = rng.random()
+        if roll < 0.03:
+            continue  # Never paid
+        if roll < 0.08:
+            payment_date = due_date + timedelta(days=rng.randint(0, 5))
+            transactions.append({'rent_payment_id': rent_payment_id, 'amount': round(amount / 2, 2),
+                                 'payment_date': payment_date, 'payment_method': 'Check', 'notes': None,
+                                 'is_charge': False})
+            statuses['Partial'].append(rent_payment_id)
+            continue
+
+        payment_date = due_date + timedelta(days=rng.randint(6, 25) if roll < 0.15 else rng.randint(-5, 0))
+        transactions.append({'rent_payment_id': rent_payment_id, 'amount': amount, 'payment_date': payment_date,
+                             'payment_method': rng.choice(['Cash', 'Check', 'Credit Card']), 'notes': None,
+                             'is_charge': False})
+        late_fee = calculate_late_fee(due_date, payment_date, amount)
+        if late_fee:
+            # Charged and collected with the payment, as the payment form records it
+            for notes, is_charge in ((ASSESSED_LATE_FEE_NOTE, True), (f'Late fee for {late_fee} days', False)):
+                transactions.append({'rent_payment_id': rent_payment_id, 'amount': late_fee,
+                                     'payment_date': payment_date, 'payment_method': 'Late Fee',
+                                     'notes': notes, 'is_charge': is_charge})
+        statuses['Late' if payment_date > due_date else 'Paid'].append(rent_payment_id)
+
+    for start in range(0, len(transactions), SEED_BATCH_SIZE):
+        db.session.execute(insert(PaymentTransaction.__table__), transactions[start:start + SEED_BATCH_SIZE])
+    for status, ids in statuses.items():
+        for start in range(0, len(ids), SEED_BATCH_SIZE):
+            db.session.execute(update(RentPayment.__table__)
+                               .where(RentPayment.id.in_(ids[start:start + SEED_BATCH_SIZE]))
+                               .values(status=status))
+    db.session.commit()
+    progress(f"Created {len(transactions)} payment transactions.")
+
+    expenses = 0
+    period = first_period
+    while period <= today:
+        days_in_month = calendar.monthrange(period.year, period.month)[1]
+        rows = []
+        for property_id in property_ids:
+            for _ in range(expenses_per_month):
+                vendor = rng.choice(SEED_VENDORS)
+                method = rng.choice(PAYMENT_METHOD_TYPES)
+                rows.append({
+                    'property_id': property_id, 'description': f'{vendor} invoice',
+                    'amount': round(rng.uniform(20, 1500), 2),
+                    'date_paid': min(period.replace(day=rng.randint(1, days_in_month)), today),
+                    'category': rng.choice(EXPENSE_CATEGORIES), 'vendor': vendor,
+                    'payment_method_type': method,
+                    'card_last_four': f'{rng.randint(0, 9999):04d}' if method == 'Credit Card' else None,
+                    'card_type': rng.choice(CARD_TYPES) if method == 'Credit Card' else None,
+                    'check_number': str(rng.randint(1000, 9999)) if method == 'Check' else None,
+                })
+        for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+            insert_expense_batch(rows[start:start + IMPORT_BATCH_SIZE])
+        expenses += len(rows)
+        period = add_months(period, 1)
+    progress(f"Created {expenses} expenses.")
+
+    # The transactions above were inserted without the summary hooks
+    rebuild_financial_summary()
+    progress("Rebuilt the financial summary.")
+
+@commands.cli.command('seed-portfolio')
+@click.option('--llcs', type=int, default=5, show_default=True)
+@click.option('--properties-per-llc', type=int, default=10, show_default=True)
+@click.option('--units-per-property', type=int, default=20, show_default=True)
+@click.option('--years', type=int, default=3, show_default=True, help='Years of rent and expense history.')
+@click.option('--expenses-per-month', type=int, default=8, show_default=True, help='Per property.')
+@click.option('--seed', type=int, help='Random seed for a repeatable portfolio.')
+@click.option('--force', is_flag=True, help='Seed even if the database already has properties.')
+def seed_portfolio_command(llcs, properties_per_llc, units_per_property, years, expenses_per_month, seed, force):
+    """Generate a synthetic portfolio in a local database."""
+    if not force and db.session.query(Property.id).first() is not None:
+        raise click.ClickException('The database already has properties; pass --force to add a portfolio anyway.')
+    seed_portfolio(llcs, properties_per_llc, units_per_property, years, expenses_per_month,
+                   seed=seed, progress=click.echo)
 
 def calculate_late_fee(due_date, payment_date, rent_amount):
     if payment_date <= due_date:
@@ -524,52 +1604,1144 @@ def calculate_late_fee(due_date, payment_date, rent_amount):
     return late_fee
 
 
-def generate_invoices_for_all_properties():
+INVOICE_BATCH_SIZE = 500
+
+def rent_due_date_for(billing_period, due_day):
+    # Clamp the unit's due day to the length of the month (e.g. the 31st in June)
+    last_day = calendar.monthrange(billing_period.year, billing_period.month)[1]
+    return billing_period.replace(day=min(due_day, last_day))
+
+def units_missing_invoice(billing_period, after_unit_id=0, limit=None):
+    """Return (id, rent_amount, rent_due_date) for units without a RentPayment for
+    `billing_period`, in id order after `after_unit_id`, using a single anti-join."""
+    return db.session.query(Unit.id, Unit.rent_amount, Unit.rent_due_date)\
+        .outerjoin(RentPayment, and_(
+            RentPayment.unit_id == Unit.id,
+            RentPayment.billing_period == billing_period
+        ))\
+        .filter(RentPayment.id.is_(None), Unit.id > after_unit_id)\
+        .order_by(Unit.id)\
+        .limit(limit)\
+        .all()
+
+def bulk_insert_rent_payments(rows, batch_size=INVOICE_BATCH_SIZE):
+    """Insert RentPayment rows with multi-row INSERTs and return how many were created.
+
+    Rows whose (unit_id, billing_period) already exists are skipped by the database,
+    so concurrent or repeated runs never create duplicate invoices.
+    """
+    created = 0
+    for start in range(0, len(rows), batch_size):
+        stmt = insert(RentPayment.__table__)\
+            .values(rows[start:start + batch_size])\
+            .prefix_with('IGNORE', dialect='mysql')\
+            .prefix_with('OR IGNORE', dialect='sqlite')
+        created += db.session.execute(stmt).rowcount
+    if created:
+        bump_property_versions(db.session.connection(), unit_ids={row['unit_id'] for row in rows})
+    return created
+
+INVOICE_CHUNK_SIZE = 2000
+
+def invoice_generation_chunks(checkpoint=None, chunk_size=INVOICE_CHUNK_SIZE):
+    """Stage next month's missing invoices chunk by chunk, without committing.
+
+    Yields (created, checkpoint) after each chunk of units. The checkpoint is
+    '<billing period>:<last unit id>' and only resumes a run for the same period.
+    """
     current_date = datetime.now().date()
     five_days_from_now = current_date + timedelta(days=5)
-    
-    # Get all properties
-    properties = Property.query.all()
-    
-    for property in properties:
-        for unit in property.units:
-            # Check if an invoice already exists for the next month
-            next_month = current_date.replace(day=1) + timedelta(days=32)
-            next_month = next_month.replace(day=1)
-            
-            existing_invoice = RentPayment.query.filter(
-                RentPayment.unit_id == unit.id,
-                func.extract('year', RentPayment.due_date) == next_month.year,
-                func.extract('month', RentPayment.due_date) == next_month.month
-            ).first()
-            
-            if not existing_invoice:
-                # Calculate the due date for the next month
-                next_due_date = next_month.replace(day=unit.rent_due_date.day)
-                
-                # Only generate the invoice if it's 5 days or less before the due date
-                if next_due_date - timedelta(days=5) <= five_days_from_now:
-                    new_invoice = RentPayment(
-                        unit_id=unit.id,
-                        due_date=next_due_date,
-                        amount=unit.rent_amount,
-                        status='Unpaid'
-                    )
-                    db.session.add(new_invoice)
-    
-    db.session.commit()
-    print(f"Invoices generated on {current_date}")
+    next_month = add_months(current_date, 1)
 
-@scheduler.task('cron', id='generate_invoices', hour=8, minute=52)
-def scheduled_invoice_generation():
-    with app.app_context():
-        generate_invoices_for_all_properties()
+    last_unit_id = 0
+    if checkpoint:
+        period, _, unit_id = checkpoint.partition(':')
+        if period == next_month.isoformat():
+            last_unit_id = int(unit_id)
+
+    while True:
+        units = units_missing_invoice(next_month, after_unit_id=last_unit_id, limit=chunk_size)
+        if not units:
+            break
+
+        new_invoices = []
+        for unit_id, rent_amount, rent_due_date in units:
+            next_due_date = rent_due_date_for(next_month, rent_due_date.day)
+
+            # Only generate the invoice if it's 5 days or less before the due date
+            if next_due_date - timedelta(days=5) <= five_days_from_now:
+                new_invoices.append({
+                    'unit_id': unit_id,
+                    'billing_period': next_month,
+                    'due_date': next_due_date,
+                    'amount': rent_amount,
+                    'status': 'Unpaid'
+                })
+
+        last_unit_id = units[-1].id
+        yield bulk_insert_rent_payments(new_invoices), f"{next_month.isoformat()}:{last_unit_id}"
+
+def generate_invoices_for_all_properties():
+    created = 0
+    for chunk_created, _ in invoice_generation_chunks():
+        created += chunk_created
+        db.session.commit()
+    current_app.logger.info('Invoices generated on %s: %s created', datetime.now().date(), created)
+    return created
+
+JOB_LOCK_PREFIX = 'triples:'
+
+class SchedulerLeadership:
+    """Elects one process to run scheduled jobs, using a MySQL advisory lock.
+
+    The leader holds GET_LOCK on a dedicated autocommit connection for as long as it
+    lives; when it exits, the lock is released with the connection and the next
+    process whose job fires takes over. Other processes skip with one cheap query.
+    """
+
+    def __init__(self, name):
+        self.name = JOB_LOCK_PREFIX + name
+        self.connection = None
+        self._lock = threading.Lock()
+
+    def _holds_lock(self):
+        try:
+            return self.connection.execute(
+                text('SELECT IS_USED_LOCK(:name) = CONNECTION_ID()'), {'name': self.name}
+            ).scalar() == 1
+        except SQLAlchemyError:
+            return False
+
+    def _release(self):
+        try:
+            self.connection.close()
+        except SQLAlchemyError:
+            pass
+        self.connection = None
+
+    def is_leader(self):
+        if db.engine.dialect.name != 'mysql':
+            return True
+        with self._lock:
+            if self.connection is not None:
+                if self._holds_lock():
+                    return True
+                self._release()
+
+            connection = db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+            try:
+                acquired = connection.execute(
+                    text('SELECT GET_LOCK(:name, 0)'), {'name': self.name}
+                ).scalar() == 1
+            except SQLAlchemyError:
+                acquired = False
+            if acquired:
+                self.connection = connection
+            else:
+                connection.close()
+            return acquired
+
+scheduler_leadership = SchedulerLeadership('scheduler-leader')
+
+@contextmanager
+def job_lock(name):
+    """Hold a per-job MySQL advisory lock; yields False if another process is running the job."""
+    if db.engine.dialect.name != 'mysql':
+        yield True
+        return
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        lock_name = JOB_LOCK_PREFIX + name
+        acquired = connection.execute(text('SELECT GET_LOCK(:name, 0)'), {'name': lock_name}).scalar() == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(text('SELECT RELEASE_LOCK(:name)'), {'name': lock_name})
+
+class JobRun(db.Model):
+    # One row per batch job run, updated as each chunk commits
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(50), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False)  # 'running', 'succeeded', 'failed', 'interrupted'
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_seconds = db.Column(db.Float, nullable=True)
+    rows_touched = db.Column(db.Integer, nullable=False, default=0)
+    checkpoint = db.Column(db.String(100), nullable=True)
+    resumed_from_id = db.Column(db.Integer, db.ForeignKey('job_run.id'), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+# Registered batch jobs: name -> {'func': chunk generator, 'trigger': APScheduler trigger arguments}
+JOBS = {}
+
+def batch_job(name, **trigger):
+    """Register a resumable batch job run by the `flask jobs` worker.
+
+    The job is a generator taking the checkpoint to resume from; it stages one chunk
+    of work at a time and yields (rows_touched, checkpoint). The runner commits the
+    chunk together with the checkpoint, so a failed run resumes where it stopped.
+    """
+    def decorator(func):
+        JOBS[name] = {'func': func, 'trigger': trigger}
+        return func
+    return decorator
+
+def run_job(name):
+    """Run a registered job to completion and record it in job_run; returns the JobRun."""
+    with job_lock(name) as acquired:
+        if not acquired:
+            current_app.logger.info('Skipping %s: already running in another process', name)
+            return None
+
+        checkpoint = None
+        previous = JobRun.query.filter_by(job_name=name).order_by(JobRun.id.desc()).first()
+        if previous is not None and previous.status in ('running', 'failed'):
+            # We hold the job lock, so a 'running' row belongs to a process that died
+            if previous.status == 'running':
+                previous.status = 'interrupted'
+            checkpoint = previous.checkpoint
+
+        run = JobRun(job_name=name, status='running', started_at=datetime.now(), rows_touched=0,
+                     checkpoint=checkpoint, resumed_from_id=previous.id if checkpoint else None)
+        db.session.add(run)
+        db.session.commit()
+
+        started = time.monotonic()
+        try:
+            for rows_touched, checkpoint in JOBS[name]['func'](checkpoint):
+                run.rows_touched += rows_touched
+                run.checkpoint = checkpoint
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            run.status = 'failed'
+            run.error = traceback.format_exc()
+        else:
+            run.status = 'succeeded'
+        run.finished_at = datetime.now()
+        run.duration_seconds = time.monotonic() - started
+        db.session.commit()
+        log = current_app.logger.info if run.status == 'succeeded' else current_app.logger.error
+        log('%s %s: %s rows in %.1fs', name, run.status, run.rows_touched, run.duration_seconds)
+        return run
+
+def run_scheduled_job(name):
+    """Scheduler entry point: run `name` in an app context on the elected leader only."""
+    with scheduler.app.app_context():
+        if scheduler_leadership.is_leader():
+            run_job(name)
+
+def start_scheduler(app):
+    scheduler.init_app(app)
+    for name, job in JOBS.items():
+        scheduler.add_job(id=name, func=run_scheduled_job, args=[name], replace_existing=True, **job['trigger'])
+    scheduler.start()
+
+@batch_job('generate_invoices', trigger='cron', hour=8, minute=52)
+def invoice_generation_job(checkpoint):
+    return invoice_generation_chunks(checkpoint)
+
+LATE_FEE_STATUS_BATCH_SIZE = 5000
+
+def overdue_rent_payments(as_of):
+    """Return every rent payment due before `as_of` that still has a balance due.
+
+    One grouped query over the RentPayment hybrids, so "paid" means the same here
+    as everywhere else; each row carries the unit's property, the amount paid,
+    the late fees charged and the id of the late fee charge row, if any.
+    """
+    return db.session.query(
+        RentPayment.id, RentPayment.due_date, RentPayment.amount, RentPayment.status, Unit.property_id,
+        RentPayment.total_paid.label('paid'), RentPayment.late_fee_total.label('charged'),
+        func.max(case((PaymentTransaction.is_charge, PaymentTransaction.id))).label('charge_id'),
+    ).join(Unit, Unit.id == RentPayment.unit_id)\
+        .outerjoin(PaymentTransaction, PaymentTransaction.rent_payment_id == RentPayment.id)\
+        .filter(RentPayment.due_date < as_of, RentPayment.status != 'Paid')\
+        .group_by(RentPayment.id, Unit.property_id)\
+        .having(RentPayment.balance_due > 0)\
+        .all()
+
+def late_fee_assessment_chunks(checkpoint=None, as_of=None):
+    """Charge late fees on overdue rent and mark it 'Late', without committing.
+
+    While the rent itself is under-paid, the charged fee is raised to
+    calculate_late_fee as of today. Each rent payment has one late fee charge
+    row (is_charge), shared with the payment form and raised in place, so
+    re-running on the same day changes nothing. Rows are written with
+    executemany and set-based UPDATEs; charges are not income, so the summary
+    is left alone.
+    """
+    as_of = as_of or datetime.now().date()
+    new_fees, changed_fees, late_ids = [], [], []
+    property_ids = set()
+    for row in overdue_rent_payments(as_of):
+        if row.status != 'Late':
+            late_ids.append(row.id)
+            property_ids.add(row.property_id)
+        fee = calculate_late_fee(row.due_date, as_of, row.amount)
+        if row.paid >= row.amount or fee <= row.charged:
+            continue
+        if row.charge_id is None:
+            new_fees.append({'rent_payment_id': row.id, 'amount': fee, 'payment_date': as_of,
+                             'payment_method': 'Late Fee', 'notes': ASSESSED_LATE_FEE_NOTE, 'is_charge': True})
+        else:
+            changed_fees.append({'fee_id': row.charge_id, 'increase': fee - row.charged})
+        property_ids.add(row.property_id)
+
+    if new_fees:
+        db.session.execute(insert(PaymentTransaction.__table__), new_fees)
+    if changed_fees:
+        table = PaymentTransaction.__table__
+        db.session.execute(update(table).where(table.c.id == bindparam('fee_id'))
+                           .values(amount=table.c.amount + bindparam('increase')), changed_fees)
+    for start in range(0, len(late_ids), LATE_FEE_STATUS_BATCH_SIZE):
+        db.session.execute(update(RentPayment.__table__)
+                           .where(RentPayment.id.in_(late_ids[start:start + LATE_FEE_STATUS_BATCH_SIZE]))
+                           .values(status='Late'))
+
+    # By property rather than by rent payment, so a first run over old history stays one small UPDATE
+    bump_property_versions(db.session.connection(), property_ids=property_ids)
+    yield len(new_fees) + len(changed_fees) + len(late_ids), as_of.isoformat()
+
+@batch_job('assess_late_fees', trigger='cron', hour=2, minute=15)
+def late_fee_assessment_job(checkpoint):
+    return late_fee_assessment_chunks(checkpoint)
+
+class ReminderMessage(db.Model):
+    # Outbox of rent reminders: rows are queued by queue_rent_reminders and sent by deliver_reminders
+    __table_args__ = (
+        db.UniqueConstraint('rent_payment_id', 'channel', name='uq_reminder_message_payment_channel'),
+        db.Index('ix_reminder_message_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    rent_payment_id = db.Column(db.Integer, db.ForeignKey('rent_payment.id', ondelete='CASCADE'), nullable=False)
+    channel = db.Column(db.String(10), nullable=False)  # 'email' or 'sms'
+    recipient = db.Column(db.String(100), nullable=False)
+    subject = db.Column(db.String(200), nullable=True)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+def rent_reminder_candidates(start, end):
+    """Return unpaid rent due between `start` and `end` that has no reminder queued, in one grouped query."""
+    already_queued = select(ReminderMessage.id).where(ReminderMessage.rent_payment_id == RentPayment.id).exists()
+    return db.session.query(
+        RentPayment.id, RentPayment.due_date, RentPayment.balance_due.label('balance'),
+        Unit.unit_number, Unit.renter_name, Unit.email, Unit.phone_number, Property.name.label('property_name'),
+    ).join(Unit, Unit.id == RentPayment.unit_id)\
+        .join(Property, Property.id == Unit.property_id)\
+        .outerjoin(PaymentTransaction, PaymentTransaction.rent_payment_id == RentPayment.id)\
+        .filter(RentPayment.due_date.between(start, end), RentPayment.status != 'Paid', ~already_queued)\
+        .group_by(RentPayment.id, Unit.id, Property.id)\
+        .having(RentPayment.balance_due > 0)\
+        .all()
+
+def rent_reminder_messages(row):
+    """Build the email and SMS reminder texts for one rent_reminder_candidates row."""
+    amount = f"${row.balance:,.2f}"
+    email_body = (f"Hi {row.renter_name},\n\n"
+                  f"This is a reminder that rent of {amount} for {row.property_name}, unit {row.unit_number}, "
+                  f"is due on {row.due_date:%B %d, %Y}.\n\n"
+                  f"If you have already paid, please disregard this message.\n")
+    sms_body = f"Reminder: rent of {amount} for unit {row.unit_number} at {row.property_name} is due {row.due_date:%m/%d}."
+    return f"Rent due {row.due_date:%B %d}", email_body, sms_body
+
+def rent_reminder_chunks(checkpoint=None, as_of=None):
+    """Queue email and SMS reminders for rent due within REMINDER_DAYS_AHEAD days, without committing.
+
+    Each invoice is reminded once per channel; the unique constraint on
+    (rent_payment_id, channel) backs up the NOT EXISTS filter of the candidate query.
+    """
+    as_of = as_of or datetime.now().date()
+    now = datetime.now()
+    messages = []
+    for row in rent_reminder_candidates(as_of, as_of + timedelta(days=current_app.config['REMINDER_DAYS_AHEAD'])):
+        subject, email_body, sms_body = rent_reminder_messages(row)
+        queued = {'rent_payment_id': row.id, 'status': 'queued', 'attempts': 0, 'next_attempt_at': now,
+                  'created_at': now}
+        if row.email:
+            messages.append(dict(queued, channel='email', recipient=row.email, subject=subject, body=email_body))
+        if row.phone_number:
+            messages.append(dict(queued, channel='sms', recipient=row.phone_number, subject=None, body=sms_body))
+
+    if messages:
+        db.session.execute(insert(ReminderMessage.__table__), messages)
+    yield len(messages), as_of.isoformat()
 
-@app.template_filter()
+def reminder_delivery_chunks(checkpoint=None):
+    """Send queued reminders REMINDER_BATCH_SIZE at a time, without committing.
+
+    One SMTP connection and one SMS backend serve the whole run, and sends are
+    paced by REMINDER_RATE_PER_SECOND. Outcomes are written back per batch with
+    executemany, so a crash mid-batch may resend that batch. A failed message is
+    retried with exponential backoff until REMINDER_MAX_ATTEMPTS, then marked 'failed'.
+    """
+    config = current_app.config
+    email = SmtpEmailBackend(config['SMTP_HOST'], config['SMTP_PORT'], username=config['SMTP_USERNAME'],
+                             password=config['SMTP_PASSWORD'], use_tls=config['SMTP_USE_TLS'],
+                             from_address=config['REMINDER_FROM_ADDRESS'])
+    sms = load_backend(config['SMS_BACKEND'])
+    limiter = RateLimiter(config['REMINDER_RATE_PER_SECOND'])
+    table = ReminderMessage.__table__
+    record_outcome = update(table).where(table.c.id == bindparam('message_id')).values(
+        status=bindparam('new_status'), attempts=bindparam('new_attempts'), next_attempt_at=bindparam('retry_at'),
+        sent_at=bindparam('sent'), last_error=bindparam('error'))
+
+    last_id = 0
+    try:
+        while True:
+            batch = db.session.query(
+                ReminderMessage.id, ReminderMessage.channel, ReminderMessage.recipient, ReminderMessage.subject,
+                ReminderMessage.body, ReminderMessage.attempts, ReminderMessage.next_attempt_at,
+            ).filter(ReminderMessage.status == 'queued', ReminderMessage.next_attempt_at <= datetime.now(),
+                     ReminderMessage.id > last_id)\
+                .order_by(ReminderMessage.id)\
+                .limit(config['REMINDER_BATCH_SIZE'])\
+                .all()
+            if not batch:
+                break
+
+            outcomes = []
+            for message in batch:
+                limiter.wait()
+                attempts = message.attempts + 1
+                try:
+                    if message.channel == 'email':
+                        email.send(message.recipient, message.subject, message.body)
+                    else:
+                        sms.send(message.recipient, message.body)
+                except Exception as error:
+                    current_app.logger.warning('Reminder %s to %s failed (attempt %s): %s',
+                                               message.id, message.recipient, attempts, error)
+                    gave_up = attempts >= config['REMINDER_MAX_ATTEMPTS']
+                    outcomes.append({'message_id': message.id, 'new_attempts': attempts, 'sent': None,
+                                     'new_status': 'failed' if gave_up else 'queued',
+                                     'retry_at': datetime.now() + timedelta(minutes=2 ** attempts),
+                                     'error': str(error)[:1000]})
+                else:
+                    outcomes.append({'message_id': message.id, 'new_status': 'sent', 'new_attempts': attempts,
+                                     'retry_at': message.next_attempt_at, 'sent': datetime.now(), 'error': None})
+
+            db.session.execute(record_outcome, outcomes)
+            last_id = batch[-1].id
+            yield len(batch), str(last_id)
+    finally:
+        email.close()
+        sms.close()
+
+@batch_job('queue_rent_reminders', trigger='cron', hour=9, minute=0)
+def rent_reminder_job(checkpoint):
+    return rent_reminder_chunks(checkpoint)
+
+@batch_job('deliver_reminders', trigger='interval', minutes=5)
+def reminder_delivery_job(checkpoint):
+    return reminder_delivery_chunks(checkpoint)
+
+@commands.cli.group('jobs', invoke_without_command=True)
+@click.pass_context
+def jobs_command(ctx):
+    """Run the scheduled batch jobs in this process (the default), or manage them."""
+    if ctx.invoked_subcommand is not None:
+        return
+    start_scheduler(current_app._get_current_object())
+    click.echo(f"Job worker started with {', '.join(JOBS)}; press Ctrl+C to stop.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        scheduler.shutdown()
+
+@jobs_command.command('run')
+@click.argument('name')
+def run_job_command(name):
+    """Run one job now, resuming a failed run if there is one."""
+    if name not in JOBS:
+        raise click.BadParameter(f"choose from {', '.join(JOBS)}", param_hint='NAME')
+    run = run_job(name)
+    if run is None:
+        raise click.ClickException(f"{name} is already running in another process.")
+    if run.status == 'failed':
+        raise click.ClickException(run.error)
+    click.echo(f"{name} {run.status}: {run.rows_touched} rows in {run.duration_seconds:.1f}s")
+
+@jobs_command.command('history')
+@click.option('--limit', type=int, default=20, show_default=True)
+def job_history_command(limit):
+    """Show the most recent job runs."""
+    for run in JobRun.query.order_by(JobRun.id.desc()).limit(limit):
+        duration = f"{run.duration_seconds:.1f}s" if run.duration_seconds is not None else '-'
+        click.echo(f"{run.id:>6}  {run.job_name:<20} {run.status:<12} {run.started_at:%Y-%m-%d %H:%M}  "
+                   f"{duration:>8}  {run.rows_touched} rows")
+
+@commands.cli.command('smtp-sink')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=1025, show_default=True)
+def smtp_sink_command(host, port):
+    """Run a local SMTP server that prints the messages it receives instead of sending them."""
+    def show(sender, recipients, data):
+        click.echo(f"--- From {sender} to {', '.join(recipients)}\n{data}")
+
+    server = SmtpSink(host, port, on_message=show)
+    click.echo(f"SMTP sink listening on {host}:{port}; set SMTP_HOST={host} SMTP_PORT={port}. Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+RENTAL_INCOME = 'Rental Income'
+TAX_ROLLUP_CACHE_SECONDS = 3600
+
+# Reports for closed years, keyed by year: (built_at, report). Entries are dropped whenever
+# apply_financial_deltas touches their year and expire after an hour for other workers' writes.
+tax_rollup_cache = {}
+tax_rollup_cache_stats = {'hit': 0, 'miss': 0}
+
+def _rollup_totals():
+    return {'categories': defaultdict(float), 'total_expenses': 0, 'income': 0, 'net': 0}
+
+def _add_to_rollup(totals, category, amount):
+    if category == RENTAL_INCOME:
+        totals['income'] += amount
+    else:
+        totals['categories'][category] += amount
+        totals['total_expenses'] += amount
+    totals['net'] = totals['income'] - totals['total_expenses']
+
+def build_tax_rollup(year):
+    """Build the LLC -> property -> category expense and rental income matrix for `year`.
+
+    Leaf totals come from one UNION ALL query grouped by (LLC, property, category);
+    the property, LLC and portfolio subtotals are rolled up from those rows.
+    """
+    start, end = period_bounds(year)
+    expenses = select(
+        LLC.id.label('llc_id'), LLC.name.label('llc_name'),
+        Property.id.label('property_id'), Property.name.label('property_name'),
+        Expense.category.label('category'), func.sum(Expense.amount).label('total')
+    ).select_from(Expense)\
+        .join(Property, Property.id == Expense.property_id)\
+        .join(LLC, LLC.id == Property.llc_id)\
+        .where(Expense.date_paid >= start, Expense.date_paid < end)\
+        .group_by(LLC.id, LLC.name, Property.id, Property.name, Expense.category)
+    income = select(
+        LLC.id, LLC.name, Property.id, Property.name,
+        literal(RENTAL_INCOME), func.sum(PropertyFinancialSummary.total_income)
+    ).select_from(PropertyFinancialSummary)\
+        .join(Property, Property.id == PropertyFinancialSummary.property_id)\
+        .join(LLC, LLC.id == Property.llc_id)\
+        .where(PropertyFinancialSummary.year == year)\
+        .group_by(LLC.id, LLC.name, Property.id, Property.name)
+    rows = db.session.execute(union_all(expenses, income)).all()
+
+    report = {'year': year, 'llcs': {}, 'totals': _rollup_totals()}
+    for llc_id, llc_name, property_id, property_name, category, total in rows:
+        if not total:
+            continue
+        llc = report['llcs'].setdefault(llc_id, {'id': llc_id, 'name': llc_name, 'properties': {},
+                                                 'totals': _rollup_totals()})
+        property = llc['properties'].setdefault(property_id, {'id': property_id, 'name': property_name,
+                                                              'totals': _rollup_totals()})
+        for totals in (property['totals'], llc['totals'], report['totals']):
+            _add_to_rollup(totals, category, total)
+
+    extra_categories = sorted(set(report['totals']['categories']) - set(EXPENSE_CATEGORIES))
+    report['categories'] = EXPENSE_CATEGORIES + extra_categories
+    report['llcs'] = sorted(report['llcs'].values(), key=lambda llc: llc['name'])
+    for llc in report['llcs']:
+        llc['properties'] = sorted(llc['properties'].values(), key=lambda property: property['name'])
+    return report
+
+def tax_rollup(year):
+    """Return the tax rollup for `year`, cached once the year is closed."""
+    if year >= datetime.now().year:
+        return build_tax_rollup(year)
+    cached = tax_rollup_cache.get(year)
+    if cached and time.monotonic() - cached[0] < TAX_ROLLUP_CACHE_SECONDS:
+        tax_rollup_cache_stats['hit'] += 1
+        return cached[1]
+    tax_rollup_cache_stats['miss'] += 1
+    report = build_tax_rollup(year)
+    # A lagging replica may not have the write that dropped this year yet, so only cache primary reads
+    if not db.session.info.get('read_replica'):
+        tax_rollup_cache[year] = (time.monotonic(), report)
+    return report
+
+@reports.route('/reports/tax')
+def tax_report():
+    year = request.args.get('year', type=int) or datetime.now().year - 1
+    return render_template('tax_report.html', report=tax_rollup(year), current_year=datetime.now().year)
+
+# (key, label, fewest days past due, most days past due); None leaves the range open
+AGING_BUCKETS = [
+    ('current', 'Current', None, 0),
+    ('days_1_30', '1-30 Days', 1, 30),
+    ('days_31_60', '31-60 Days', 31, 60),
+    ('days_61_90', '61-90 Days', 61, 90),
+    ('days_over_90', '90+ Days', 91, None),
+]
+
+def _aging_totals():
+    return dict.fromkeys([key for key, _, _, _ in AGING_BUCKETS] + ['total'], 0)
+
+def build_ar_aging(as_of, llc_id=None, property_id=None):
+    """Build the LLC -> property -> unit receivables aging as of `as_of`.
+
+    Open balances (RentPayment.balance_due) are computed per invoice in a grouped
+    subquery and bucketed by due date per unit in the outer query, so one statement
+    returns every unit's row; property, LLC and portfolio subtotals are rolled up
+    from those rows.
+    """
+    open_invoices = select(
+        RentPayment.unit_id, RentPayment.due_date, RentPayment.balance_due.label('balance')
+    ).select_from(RentPayment)\
+        .outerjoin(PaymentTransaction, PaymentTransaction.rent_payment_id == RentPayment.id)\
+        .where(RentPayment.status != 'Paid')\
+        .group_by(RentPayment.id)\
+        .having(RentPayment.balance_due > 0)
+    if property_id is not None:
+        open_invoices = open_invoices.where(RentPayment.unit_id.in_(
+            select(Unit.id).where(Unit.property_id == property_id)))
+    elif llc_id is not None:
+        open_invoices = open_invoices.where(RentPayment.unit_id.in_(
+            select(Unit.id).join(Property).where(Property.llc_id == llc_id)))
+    open_invoices = open_invoices.subquery()
+
+    # Days past due are compared as due-date ranges, which works the same on every database
+    buckets = []
+    for key, _, fewest_days, most_days in AGING_BUCKETS:
+        conditions = []
+        if fewest_days is not None:
+            conditions.append(open_invoices.c.due_date <= as_of - timedelta(days=fewest_days))
+        if most_days is not None:
+            conditions.append(open_invoices.c.due_date >= as_of - timedelta(days=most_days))
+        buckets.append(func.sum(case((and_(*conditions), open_invoices.c.balance), else_=0)).label(key))
+
+    rows = db.session.execute(
+        select(LLC.id.label('llc_id'), LLC.name.label('llc_name'),
+               Property.id.label('property_id'), Property.name.label('property_name'),
+               Unit.id.label('unit_id'), Unit.unit_number, Unit.renter_name,
+               *buckets, func.sum(open_invoices.c.balance).label('total'))
+        .select_from(open_invoices)
+        .join(Unit, Unit.id == open_invoices.c.unit_id)
+        .join(Property, Property.id == Unit.property_id)
+        .join(LLC, LLC.id == Property.llc_id)
+        .group_by(LLC.id, LLC.name, Property.id, Property.name, Unit.id, Unit.unit_number, Unit.renter_name)
+        .order_by(LLC.name, LLC.id, Property.name, Property.id, Unit.unit_number)
+    ).all()
+
+    report = {'as_of': as_of, 'buckets': [(key, label) for key, label, _, _ in AGING_BUCKETS],
+              'llcs': [], 'totals': _aging_totals()}
+    llcs, properties = {}, {}
+    for row in rows:
+        llc = llcs.get(row.llc_id)
+        if llc is None:
+            llc = llcs[row.llc_id] = {'id': row.llc_id, 'name': row.llc_name, 'properties': [],
+                                      'totals': _aging_totals()}
+            report['llcs'].append(llc)
+        property = properties.get(row.property_id)
+        if property is None:
+            property = properties[row.property_id] = {'id': row.property_id, 'name': row.property_name,
+                                                      'units': [], 'totals': _aging_totals()}
+            llc['properties'].append(property)
+        unit = {'id': row.unit_id, 'unit_number': row.unit_number, 'renter_name': row.renter_name,
+                'totals': {key: row._mapping[key] for key in report['totals']}}
+        property['units'].append(unit)
+        for totals in (property['totals'], llc['totals'], report['totals']):
+            for key, amount in unit['totals'].items():
+                totals[key] += amount
+    return report
+
+@reports.route('/reports/ar-aging')
+def ar_aging_report():
+    llc_id = request.args.get('llc_id', type=int)
+    property_id = request.args.get('property_id', type=int)
+    scope = None
+    if property_id is not None:
+        scope = Property.query.get_or_404(property_id)
+    elif llc_id is not None:
+        scope = LLC.query.get_or_404(llc_id)
+    report = build_ar_aging(datetime.now().date(), llc_id=llc_id, property_id=property_id)
+    return render_template('ar_aging.html', report=report, scope=scope)
+
+# (CSV header, rent roll column)
+RENT_ROLL_COLUMNS = [
+    ('LLC', 'llc_name'), ('Property', 'property_name'), ('Unit', 'unit_number'), ('Renter', 'renter_name'),
+    ('Rent', 'rent_amount'), ('Due Day', 'due_day'), ('Charged This Month', 'charged'),
+    ('Last Payment', 'last_payment_date'), ('Balance', 'balance'), ('Months in Arrears', 'months_in_arrears'),
+]
+
+def rent_roll_query(month_start, as_of, llc_id=None, property_id=None):
+    """Select one rent roll row per unit for the month starting `month_start`.
+
+    Invoice totals are grouped per RentPayment, then window functions over each
+    unit's invoices give the last payment date, the running balance through the
+    latest invoice and the count of past-due invoices, so the whole portfolio
+    comes back from one statement. Balances count only transactions dated before
+    the month ends, so a past month shows what was owed then.
+    """
+    month_end = add_months(month_start, 1)
+    invoices = select(
+        RentPayment.unit_id, RentPayment.billing_period, RentPayment.due_date, RentPayment.amount,
+        RentPayment.balance_due.label('balance'),
+        func.max(case((~PaymentTransaction.is_charge, PaymentTransaction.payment_date))).label('last_paid'),
+    ).select_from(RentPayment)\
+        .outerjoin(PaymentTransaction, and_(PaymentTransaction.rent_payment_id == RentPayment.id,
+                                            PaymentTransaction.payment_date < month_end))\
+        .where(RentPayment.billing_period < month_end)\
+        .group_by(RentPayment.id)\
+        .subquery()
+
+    by_unit = {'partition_by': invoices.c.unit_id}
+    in_arrears = and_(invoices.c.balance > 0, invoices.c.due_date < as_of)
+    ledger = select(
+        invoices.c.unit_id,
+        case((invoices.c.billing_period == month_start, invoices.c.amount), else_=0).label('charged'),
+        func.max(invoices.c.last_paid).over(**by_unit).label('last_payment_date'),
+        func.sum(invoices.c.balance).over(order_by=invoices.c.billing_period, **by_unit).label('balance'),
+        func.sum(case((in_arrears, 1), else_=0)).over(**by_unit).label('months_in_arrears'),
+        func.row_number().over(order_by=invoices.c.billing_period.desc(), **by_unit).label('position'),
+    ).subquery()
+
+    stmt = select(
+        LLC.name.label('llc_name'), Property.id.label('property_id'), Property.name.label('property_name'),
+        Unit.id.label('unit_id'), Unit.unit_number, Unit.renter_name, Unit.rent_amount,
+        extract('day', Unit.rent_due_date).label('due_day'),
+        func.coalesce(ledger.c.charged, 0).label('charged'), ledger.c.last_payment_date,
+        func.coalesce(ledger.c.balance, 0).label('balance'),
+        func.coalesce(ledger.c.months_in_arrears, 0).label('months_in_arrears'),
+    ).select_from(Unit)\
+        .join(Property, Property.id == Unit.property_id)\
+        .join(LLC, LLC.id == Property.llc_id)\
+        .outerjoin(ledger, and_(ledger.c.unit_id == Unit.id, ledger.c.position == 1))\
+        .order_by(LLC.name, LLC.id, Property.name, Property.id, Unit.unit_number)
+    if property_id is not None:
+        stmt = stmt.where(Unit.property_id == property_id)
+    elif llc_id is not None:
+        stmt = stmt.where(Property.llc_id == llc_id)
+    return stmt
+
+@reports.route('/reports/rent-roll')
+def rent_roll_report():
+    today = datetime.now().date()
+    month = request.args.get('month')
+    try:
+        month_start = datetime.strptime(month, '%Y-%m').date() if month else today.replace(day=1)
+    except ValueError:
+        abort(400)
+    # Past months are reported as of their last day
+    as_of = min(today, add_months(month_start, 1) - timedelta(days=1))
+    llc_id = request.args.get('llc_id', type=int)
+    property_id = request.args.get('property_id', type=int)
+    stmt = rent_roll_query(month_start, as_of, llc_id=llc_id, property_id=property_id)
+
+    if request.args.get('format') == 'csv':
+        def rows():
+            result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            for partition in result.partitions():
+                for row in partition:
+                    yield [row._mapping[key] for _, key in RENT_ROLL_COLUMNS]
+
+        filename = f"rent-roll-{month_start.strftime('%Y-%m')}.csv"
+        return Response(stream_with_context(stream_csv([label for label, _ in RENT_ROLL_COLUMNS], rows())),
+                        mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+    rows = db.session.execute(stmt).all()
+    totals = {key: sum(row._mapping[key] for row in rows) for key in ('rent_amount', 'charged', 'balance')}
+    return render_template('rent_roll.html', rows=rows, totals=totals, month_start=month_start, as_of=as_of,
+                           llc_id=llc_id, property_id=property_id)
+
+EXPORT_BATCH_SIZE = 1000
+
+def _export_specs():
+    """Columns, date/category filters and joins for each exportable table."""
+    return {
+        'expenses': {
+            'model': Expense,
+            'columns': [
+                ('Date Paid', Expense.date_paid), ('LLC', LLC.name), ('Property', Property.name),
+                ('Description', Expense.description), ('Vendor', Expense.vendor),
+                ('Category', Expense.category), ('Amount', Expense.amount),
+                ('Payment Method', Expense.payment_method_type), ('Card Type', Expense.card_type),
+                ('Card Last Four', Expense.card_last_four), ('Check Number', Expense.check_number),
+            ],
+            'date': Expense.date_paid,
+            'category': Expense.category,
+            'joins': [(Property, Property.id == Expense.property_id)],
+        },
+        'payables': {
+            'model': Payable,
+            'columns': [
+                ('Due Date', Payable.due_date), ('LLC', LLC.name), ('Property', Property.name),
+                ('Description', Payable.description), ('Vendor', Payable.vendor),
+                ('Category', Payable.category), ('Amount', Payable.amount), ('Paid', Payable.paid),
+            ],
+            'date': Payable.due_date,
+            'category': Payable.category,
+            'joins': [(Property, Property.id == Payable.property_id)],
+        },
+        'rent_payments': {
+            'model': RentPayment,
+            'columns': [
+                ('Due Date', RentPayment.due_date), ('LLC', LLC.name), ('Property', Property.name),
+                ('Unit', Unit.unit_number), ('Renter', Unit.renter_name), ('Amount', RentPayment.amount),
+                ('Status', RentPayment.status),
+            ],
+            'date': RentPayment.due_date,
+            'category': None,
+            'joins': [(Unit, Unit.id == RentPayment.unit_id), (Property, Property.id == Unit.property_id)],
+        },
+        'payment_transactions': {
+            'model': PaymentTransaction,
+            'columns': [
+                ('Payment Date', PaymentTransaction.payment_date), ('LLC', LLC.name), ('Property', Property.name),
+                ('Unit', Unit.unit_number), ('Renter', Unit.renter_name),
+                ('Rent Due Date', RentPayment.due_date), ('Amount', PaymentTransaction.amount),
+                ('Payment Method', PaymentTransaction.payment_method), ('Notes', PaymentTransaction.notes),
+                ('Charge', PaymentTransaction.is_charge),
+            ],
+            'date': PaymentTransaction.payment_date,
+            'category': None,
+            'joins': [(RentPayment, RentPayment.id == PaymentTransaction.rent_payment_id),
+                      (Unit, Unit.id == RentPayment.unit_id), (Property, Property.id == Unit.property_id)],
+        },
+    }
+
+def parse_export_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        abort(400)
+
+def export_rows(spec, filters):
+    """Yield export rows from a server-side cursor, EXPORT_BATCH_SIZE rows at a time."""
+    model = spec['model']
+    stmt = select(*[column for _, column in spec['columns']]).select_from(model)
+    for target, onclause in spec['joins']:
+        stmt = stmt.join(target, onclause)
+    stmt = stmt.join(LLC, LLC.id == Property.llc_id)
+
+    if filters['llc_id']:
+        stmt = stmt.where(Property.llc_id == filters['llc_id'])
+    if filters['property_id']:
+        stmt = stmt.where(Property.id == filters['property_id'])
+    if filters['start']:
+        stmt = stmt.where(spec['date'] >= filters['start'])
+    if filters['end']:
+        stmt = stmt.where(spec['date'] <= filters['end'])
+    if filters['category'] and spec['category'] is not None:
+        stmt = stmt.where(spec['category'] == filters['category'])
+    stmt = stmt.order_by(spec['date'], model.id)
+
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        yield from partition
+
+def stream_csv(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def stream_xlsx(header, rows):
+    # openpyxl's write-only workbook spools rows to disk, so only the finished file is streamed
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in rows:
+        sheet.append(list(row))
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while chunk := output.read(64 * 1024):
+            yield chunk
+
+@reports.route('/export/<kind>')
+def export(kind):
+    spec = _export_specs().get(kind)
+    if spec is None:
+        abort(404)
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'xlsx'):
+        abort(400)
+    if export_format == 'xlsx' and Workbook is None:
+        flash('XLSX export requires the openpyxl package.', 'error')
+        return redirect(request.referrer or url_for('main.index'))
+
+    filters = {
+        'llc_id': request.args.get('llc_id', type=int),
+        'property_id': request.args.get('property_id', type=int),
+        'start': parse_export_date(request.args.get('start')),
+        'end': parse_export_date(request.args.get('end')),
+        'category': request.args.get('category'),
+    }
+    header = [label for label, _ in spec['columns']]
+    rows = export_rows(spec, filters)
+    filename = f"{kind}-{datetime.now().strftime('%Y%m%d')}.{export_format}"
+
+    if export_format == 'csv':
+        body, mimetype = stream_csv(header, rows), 'text/csv'
+    else:
+        body, mimetype = stream_xlsx(header, rows), \
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+API_MAX_PAGE_SIZE = 500
+API_STREAM_BATCH_SIZE = 1000
+
+def _filter_on(column, convert=int):
+    return lambda value: column == convert(value)
+
+def _api_resources():
+    """Fields, filters and base query for each /api/v1 collection.
+
+    Filters map a query-string argument to a function building the WHERE clause;
+    'start'/'end' filter on the resource's date column.
+    """
+    units_of_llc = lambda value: select(Unit.id).join(Property).where(Property.llc_id == int(value))
+    units_of_property = lambda value: select(Unit.id).where(Unit.property_id == int(value))
+    return {
+        'llcs': {
+            'model': LLC,
+            'fields': {'id': LLC.id, 'name': LLC.name},
+            'filters': {},
+        },
+        'properties': {
+            'model': Property,
+            'fields': {'id': Property.id, 'llc_id': Property.llc_id, 'name': Property.name,
+                       'address': Property.address},
+            'filters': {'llc_id': _filter_on(Property.llc_id)},
+        },
+        'units': {
+            'model': Unit,
+            'fields': {'id': Unit.id, 'property_id': Unit.property_id, 'unit_number': Unit.unit_number,
+                       'renter_name': Unit.renter_name, 'phone_number': Unit.phone_number,
+                       'email': Unit.email, 'rent_amount': Unit.rent_amount,
+                       'rent_due_date': Unit.rent_due_date},
+            'filters': {
+                'property_id': _filter_on(Unit.property_id),
+                'llc_id': lambda value: Unit.id.in_(units_of_llc(value)),
+            },
+        },
+        'expenses': {
+            'model': Expense,
+            'fields': {'id': Expense.id, 'property_id': Expense.property_id,
+                       'description': Expense.description, 'amount': Expense.amount,
+                       'date_paid': Expense.date_paid, 'category': Expense.category, 'vendor': Expense.vendor,
+                       'payment_method_type': Expense.payment_method_type, 'card_type': Expense.card_type,
+                       'card_last_four': Expense.card_last_four, 'check_number': Expense.check_number},
+            'date': Expense.date_paid,
+            'filters': {
+                'property_id': _filter_on(Expense.property_id),
+                'llc_id': lambda value: Expense.property_id.in_(
+                    select(Property.id).where(Property.llc_id == int(value))),
+                'category': _filter_on(Expense.category, str),
+                'vendor': _filter_on(Expense.vendor, str),
+                'payment_method_type': _filter_on(Expense.payment_method_type, str),
+            },
+        },
+        'rent-payments': {
+            'model': RentPayment,
+            'fields': {'id': RentPayment.id, 'unit_id': RentPayment.unit_id,
+                       'billing_period': RentPayment.billing_period, 'due_date': RentPayment.due_date,
+                       'amount': RentPayment.amount, 'status': RentPayment.status,
+                       'total_paid': RentPayment.total_paid, 'late_fee_total': RentPayment.late_fee_total,
+                       'balance_due': RentPayment.balance_due},
+            'date': RentPayment.due_date,
+            # The payment totals are aggregates over the transactions
+            'query': lambda query: query.outerjoin(RentPayment.transactions).group_by(RentPayment.id),
+            'filters': {
+                'unit_id': _filter_on(RentPayment.unit_id),
+                'property_id': lambda value: RentPayment.unit_id.in_(units_of_property(value)),
+                'llc_id': lambda value: RentPayment.unit_id.in_(units_of_llc(value)),
+                'status': _filter_on(RentPayment.status, str),
+                'billing_period': _filter_on(RentPayment.billing_period, parse_billing_period),
+            },
+        },
+    }
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return float(value)  # Decimal sums from the database
+
+def dump_json(value):
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default)
+    return json.dumps(value, default=_json_default, separators=(',', ':')).encode()
+
+def json_response(value, status=200):
+    return Response(dump_json(value), status=status, mimetype='application/json')
+
+def api_query(spec, fields):
+    """Build a query selecting only `fields` from a resource, with the request's filters applied."""
+    query = db.session.query(*[spec['fields'][name].label(name) for name in fields])\
+        .select_from(spec['model'])
+    if 'query' in spec:
+        query = spec['query'](query)
+
+    try:
+        for name, condition in spec['filters'].items():
+            value = request.args.get(name)
+            if value:
+                query = query.filter(condition(value))
+        if 'date' in spec:
+            start, end = request.args.get('start'), request.args.get('end')
+            if start:
+                query = query.filter(spec['date'] >= datetime.strptime(start, '%Y-%m-%d').date())
+            if end:
+                query = query.filter(spec['date'] <= datetime.strptime(end, '%Y-%m-%d').date())
+    except ValueError:
+        abort(400, 'Invalid filter value')
+    return query
+
+def api_fields(spec):
+    """Fields named by ?fields=a,b (always including the id), or all of them."""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(spec['fields'])
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in spec['fields']]
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}")
+    return ['id'] + [name for name in dict.fromkeys(fields) if name != 'id']
+
+def stream_ndjson(query, fields):
+    """Yield every row of `query` as newline-delimited JSON, read through a server-side cursor."""
+    result = db.session.execute(query.statement.execution_options(yield_per=API_STREAM_BATCH_SIZE))
+    for partition in result.partitions():
+        yield b''.join(dump_json({name: row._mapping[name] for name in fields}) + b'\n' for row in partition)
+
+@api.route('/<resource>')
+def api_collection(resource):
+    """One page of a collection, ordered by id; pass ?format=ndjson to stream all matching rows."""
+    spec = _api_resources().get(resource)
+    if spec is None:
+        abort(404)
+    fields = api_fields(spec)
+    query = api_query(spec, fields)
+
+    if request.args.get('format') == 'ndjson':
+        id_column = spec['fields']['id']
+        return Response(stream_with_context(stream_ndjson(query.order_by(id_column), fields)),
+                        mimetype='application/x-ndjson')
+
+    page_size = min(request.args.get('limit', PAGE_SIZE, type=int), API_MAX_PAGE_SIZE)
+    rows, next_cursor = keyset_page(query, spec['fields']['id'], cursor=request.args.get('cursor'),
+                                    page_size=max(page_size, 1))
+    return json_response({
+        'data': [{name: row._mapping[name] for name in fields} for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+@api.route('/<resource>/<int:item_id>')
+def api_item(resource, item_id):
+    spec = _api_resources().get(resource)
+    if spec is None:
+        abort(404)
+    fields = api_fields(spec)
+    row = api_query(spec, fields).filter(spec['fields']['id'] == item_id).first()
+    if row is None:
+        abort(404)
+    return json_response({'data': {name: row._mapping[name] for name in fields}})
+
+@api.app_errorhandler(HTTPException)
+def handle_http_exception(error):
+    # API clients get JSON errors; everything else keeps the default error pages
+    if request.path.startswith(API_PREFIX + '/'):
+        return json_response({'error': error.description}, error.code)
+    return error
+
+JOB_LAST_DURATION = metrics.register(Gauge(
+    'job_last_run_duration_seconds', 'Duration of the latest run of each batch job.', ['job']))
+JOB_LAST_ROWS = metrics.register(Gauge(
+    'job_last_run_rows', 'Rows touched by the latest run of each batch job.', ['job']))
+JOB_LAST_SUCCESS = metrics.register(Gauge(
+    'job_last_run_succeeded', '1 if the latest run of each batch job succeeded, else 0.', ['job']))
+JOB_LAST_FINISHED = metrics.register(Gauge(
+    'job_last_run_finished_timestamp_seconds', 'When the latest run of each batch job finished.', ['job']))
+JOB_RUNS = metrics.register(Gauge('job_runs', 'Recorded batch job runs by status.', ['job', 'status']))
+
+def _cache_requests():
+    for result in ('hit', 'miss'):
+        yield ('fragment', result), fragment_cache.hits if result == 'hit' else fragment_cache.misses
+        yield ('tax_rollup', result), tax_rollup_cache_stats[result]
+
+def _pool_connections():
+    for bind, engine in db.engines.items():
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            yield (bind or 'default', 'checked_out'), pool.checkedout()
+            yield (bind or 'default', 'idle'), pool.checkedin()
+            yield (bind or 'default', 'size'), pool.size()
+
+metrics.register(CallbackMetric('cache_requests_total', 'Cache lookups by cache and result.', _cache_requests,
+                                ['cache', 'result'], kind='counter'))
+metrics.register(CallbackMetric('vendor_index_rebuilds_total', 'Vendor autocomplete index rebuilds.',
+                                lambda: [((), vendor_index.generation)], kind='counter'))
+metrics.register(CallbackMetric('db_pool_connections', 'Connection pool state by bind.', _pool_connections,
+                                ['bind', 'state']))
+
+def refresh_job_metrics():
+    # Jobs run in the `flask jobs` worker, so their metrics come from job_run rather than this process
+    latest = db.session.query(func.max(JobRun.id)).group_by(JobRun.job_name)
+    for run in JobRun.query.filter(JobRun.id.in_(latest)):
+        JOB_LAST_ROWS.set(run.rows_touched, job=run.job_name)
+        JOB_LAST_SUCCESS.set(1 if run.status == 'succeeded' else 0, job=run.job_name)
+        if run.duration_seconds is not None:
+            JOB_LAST_DURATION.set(run.duration_seconds, job=run.job_name)
+        if run.finished_at is not None:
+            JOB_LAST_FINISHED.set(run.finished_at.timestamp(), job=run.job_name)
+    for job_name, status, count in db.session.query(JobRun.job_name, JobRun.status, func.count())\
+            .group_by(JobRun.job_name, JobRun.status):
+        JOB_RUNS.set(count, job=job_name, status=status)
+
+@ops.route('/metrics')
+def metrics_endpoint():
+    refresh_job_metrics()
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@main.app_template_filter()
 def currencyformat(value):
     return "${:,.2f}".format(value)
 
+def create_app(config=None):
+    """Build and configure the application; `config` overrides the environment settings."""
+    app = Flask(__name__)
+    app.config.update(default_config())
+    app.config.update(config or {})
+
+    # Compiled templates are kept on disk, so new workers and CLI runs skip recompiling them
+    os.makedirs(app.config['JINJA_CACHE_DIR'], exist_ok=True)
+    app.jinja_options = {**app.jinja_options,
+                         'bytecode_cache': FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR'])}
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+    bootstrap.init_app(app)
+    for blueprint in (ops, main, reports, api, commands):
+        app.register_blueprint(blueprint)
+
+    if os.getenv('RUN_SCHEDULER_IN_WEB'):
+        start_scheduler(app)
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
         create_initial_payment_methods()
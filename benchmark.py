@@ -0,0 +1,242 @@
+# benchmark.py
+"""Measure latency and SQL query counts of the hot routes and jobs, in-process.
+
+Run it against a local database filled by the seed command - the invoice job
+case writes and then deletes rent payments, so never point it at production:
+
+    flask seed-portfolio --seed 1
+    python benchmark.py run                   # saves .benchmarks/<commit>.json
+    python benchmark.py compare HEAD~3 HEAD   # compare two saved runs
+
+Each case runs a few warm-up iterations before the measured ones.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+RESULTS_DIR = '.benchmarks'
+
+
+def git_commit():
+    """Return (short sha, dirty) for the working tree, or ('unknown', True) outside git."""
+    try:
+        sha = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', True
+    return sha, dirty
+
+
+def resolve_commit(ref):
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', ref], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ref
+
+
+class QueryCounter:
+    """Counts statements executed on every engine of the app."""
+
+    def __init__(self, engines):
+        from sqlalchemy import event
+
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._increment)
+
+    def _increment(self, *args):
+        self.count += 1
+
+
+class Benchmark:
+    def __init__(self, iterations, warmup):
+        from app import create_app, db
+
+        app = create_app()
+        self.app = app
+        self.db = db
+        self.client = app.test_client()
+        self.iterations = iterations
+        self.warmup = warmup
+        with app.app_context():
+            self.queries = QueryCounter(db.engines.values())
+
+    def measure(self, action, setup=None, cleanup=None, iterations=None):
+        """Time `action` and count its queries; `setup`/`cleanup` run untimed around each call."""
+        timings, query_counts = [], []
+        for iteration in range(self.warmup + (iterations or self.iterations)):
+            if setup:
+                setup()
+            queries_before = self.queries.count
+            started = time.perf_counter()
+            action()
+            elapsed = time.perf_counter() - started
+            query_count = self.queries.count - queries_before
+            if cleanup:
+                cleanup()
+            if iteration >= self.warmup:
+                timings.append(elapsed)
+                query_counts.append(query_count)
+
+        timings.sort()
+        return {
+            'iterations': len(timings),
+            'min_ms': timings[0] * 1000,
+            'median_ms': statistics.median(timings) * 1000,
+            'mean_ms': statistics.mean(timings) * 1000,
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+            'max_ms': timings[-1] * 1000,
+            'queries': statistics.median(query_counts),
+        }
+
+    def get(self, path):
+        response = self.client.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {path} returned {response.status_code}')
+
+    def fixtures(self):
+        from app import Property, Unit, RentPayment, Vendor
+        from sqlalchemy import func
+
+        db = self.db
+        with self.app.app_context():
+            # The busiest property and unit, so the cases exercise the largest pages
+            property_id = db.session.query(Unit.property_id).group_by(Unit.property_id)\
+                .order_by(func.count().desc()).limit(1).scalar()
+            unit_id = db.session.query(RentPayment.unit_id).group_by(RentPayment.unit_id)\
+                .order_by(func.count().desc()).limit(1).scalar()
+            vendor = db.session.query(Vendor.name).order_by(Vendor.use_count.desc()).limit(1).scalar()
+            counts = {model.__tablename__: db.session.query(func.count()).select_from(model).scalar()
+                      for model in (Property, Unit, RentPayment, Vendor)}
+        if property_id is None or unit_id is None:
+            raise SystemExit('The database is empty; run `flask seed-portfolio` first.')
+        return property_id, unit_id, vendor or 'a', counts
+
+    def run(self):
+        from app import RentPayment, fragment_cache, generate_invoices_for_all_properties, vendor_index
+        from sqlalchemy import delete, func
+
+        property_id, unit_id, vendor, counts = self.fixtures()
+        keystrokes = [vendor[:length].lower() for length in range(1, min(len(vendor), 6) + 1)]
+
+        def type_vendor():
+            for query in keystrokes:
+                self.get(f'/vendor-suggestions?query={query}')
+
+        db = self.db
+        invoice_state = {}
+
+        def note_last_invoice():
+            with self.app.app_context():
+                invoice_state['last_id'] = db.session.query(func.max(RentPayment.id)).scalar() or 0
+
+        def generate_invoices():
+            with self.app.app_context():
+                generate_invoices_for_all_properties()
+
+        def delete_new_invoices():
+            with self.app.app_context():
+                db.session.execute(delete(RentPayment).where(RentPayment.id > invoice_state['last_id']))
+                db.session.commit()
+
+        cases = {
+            'property_detail': lambda: self.measure(lambda: self.get(f'/property/{property_id}'),
+                                                    setup=fragment_cache.clear),
+            'property_detail (cached)': lambda: self.measure(lambda: self.get(f'/property/{property_id}')),
+            'unit_rent_payments': lambda: self.measure(lambda: self.get(f'/unit/{unit_id}/rent_payments'),
+                                                       setup=fragment_cache.clear),
+            'unit_rent_payments (cached)': lambda: self.measure(
+                lambda: self.get(f'/unit/{unit_id}/rent_payments')),
+            'vendor_suggestions (typing)': lambda: self.measure(type_vendor),
+            'vendor_suggestions (index rebuild)': lambda: self.measure(type_vendor, setup=vendor_index.invalidate),
+            'generate_invoices_for_all_properties': lambda: self.measure(
+                generate_invoices, setup=note_last_invoice, cleanup=delete_new_invoices,
+                iterations=max(1, self.iterations // 4)),
+        }
+
+        results = {}
+        for name, case in cases.items():
+            results[name] = case()
+            print(f"{name:<40}{results[name]['median_ms']:>10.1f} ms{results[name]['queries']:>8g} queries")
+
+        with self.app.app_context():
+            dialect = db.engine.dialect.name
+        return {'database': dialect, 'portfolio': counts, 'cases': results}
+
+
+def results_path(commit, dirty):
+    return os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+
+
+def run(args):
+    commit, dirty = git_commit()
+    report = Benchmark(args.iterations, args.warmup).run()
+    report.update(commit=commit, dirty=dirty, recorded_at=datetime.now().isoformat(timespec='seconds'))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = args.output or results_path(commit, dirty)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {path}")
+
+
+def load(ref):
+    if os.path.exists(ref):
+        path = ref
+    else:
+        commit = resolve_commit(ref)
+        path = results_path(commit, False)
+        if not os.path.exists(path):
+            path = results_path(commit, True)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise SystemExit(f'No saved benchmark for {ref}; run `python benchmark.py run` on that commit.')
+
+
+def compare(args):
+    base, head = load(args.base), load(args.head)
+    print(f"{base['commit']} -> {head['commit']}")
+    if base['portfolio'] != head['portfolio']:
+        print(f"Warning: different portfolios ({base['portfolio']} vs {head['portfolio']})")
+    print(f"{'case':<40}{'base ms':>10}{'head ms':>10}{'change':>9}{'queries':>12}")
+    for name, stats in head['cases'].items():
+        before = base['cases'].get(name)
+        if before is None:
+            print(f"{name:<40}{'-':>10}{stats['median_ms']:>10.1f}{'new':>9}{stats['queries']:>12g}")
+            continue
+        change = (stats['median_ms'] - before['median_ms']) / before['median_ms'] if before['median_ms'] else 0
+        queries = f"{before['queries']:g} -> {stats['queries']:g}"
+        print(f"{name:<40}{before['median_ms']:>10.1f}{stats['median_ms']:>10.1f}{change:>9.1%}{queries:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Benchmark the working tree and save the results.')
+    run_parser.add_argument('--iterations', type=int, default=20, help='Measured iterations per case.')
+    run_parser.add_argument('--warmup', type=int, default=2, help='Unmeasured iterations per case.')
+    run_parser.add_argument('--output', help=f'Results file (default {RESULTS_DIR}/<commit>.json).')
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two saved runs.')
+    compare_parser.add_argument('base', help='Commit or results file to compare against.')
+    compare_parser.add_argument('head', nargs='?', default='HEAD', help='Commit or results file (default HEAD).')
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
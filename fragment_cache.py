@@ -0,0 +1,97 @@
+# fragment_cache.py
+"""Cache for rendered page fragments: an in-process LRU with an optional on-disk tier."""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """LRU cache of rendered HTML keyed by strings.
+
+    Keys embed a version (e.g. 'property:12:v41:units'), so entries are never
+    invalidated in place - a write bumps the version and old entries age out.
+    When `directory` is set, fragments are also written there so every worker on
+    the host shares them; files older than `max_age` seconds are pruned.
+    """
+
+    def __init__(self, max_entries=512, directory=None, max_age=86400):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        value = None
+        if self.directory:
+            try:
+                with open(self._path(key), encoding='utf-8') as f:
+                    value = f.read()
+            except OSError:
+                pass
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, value)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+            self._writes += 1
+            prune = self.directory and self._writes % 100 == 0
+        if self.directory:
+            self._write_file(key, value)
+            if prune:
+                self._prune_files()
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _write_file(self, key, value):
+        # Write then rename, so other workers never read a partial fragment
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(value)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            pass
+
+    def _prune_files(self):
+        cutoff = time.time() - self.max_age
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
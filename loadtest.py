@@ -0,0 +1,205 @@
+# loadtest.py
+"""Replay a realistic mix of staff traffic against a running instance of the app.
+
+Run it against a local server backed by a seeded database - it records rent
+payments and marks payables as paid, so never point it at production:
+
+    flask seed-portfolio --seed 1
+    flask run &
+    python loadtest.py --base-url http://127.0.0.1:5000 --concurrency 12 --duration 60
+
+Latency percentiles, throughput and error rates are reported per route.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+# Relative weight of each scenario in the traffic mix
+SCENARIO_WEIGHTS = {
+    'property_detail': 40,
+    'unit_rent_payments': 20,
+    'record_rent_payment': 15,
+    'vendor_suggestions': 20,
+    'mark_payable_as_paid': 5,
+}
+
+
+class NoRedirect(HTTPRedirectHandler):
+    # POSTs answer with a redirect; time the POST itself, not the page behind it
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def load_fixtures(limit):
+    """Collect ids to request from the database the app is configured for."""
+    from app import create_app, db, Property, Unit, RentPayment, Payable, Expense
+
+    with create_app().app_context():
+        return {
+            'property_ids': [row[0] for row in db.session.query(Property.id).limit(limit)],
+            'unit_ids': [row[0] for row in db.session.query(Unit.id).limit(limit)],
+            'rent_payments': [tuple(row) for row in db.session.query(RentPayment.unit_id, RentPayment.id)
+                              .filter(RentPayment.status != 'Paid').limit(limit)],
+            'payable_ids': [row[0] for row in db.session.query(Payable.id).limit(limit)],
+            'vendors': [row[0] for row in db.session.query(Expense.vendor).distinct().limit(limit)],
+        }
+
+
+class LoadTest:
+    def __init__(self, base_url, fixtures, seed=None):
+        self.base_url = base_url.rstrip('/')
+        self.fixtures = fixtures
+        self.opener = build_opener(NoRedirect)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)  # route -> [(seconds, ok)]
+        self.errors = defaultdict(lambda: defaultdict(int))  # route -> error -> count
+
+    def request(self, route, path, data=None):
+        body = urlencode(data).encode() if data is not None else None
+        started = time.perf_counter()
+        error = None
+        try:
+            with self.opener.open(Request(self.base_url + path, data=body), timeout=30) as response:
+                response.read()
+        except HTTPError as exc:
+            if exc.code >= 400:
+                error = f'HTTP {exc.code}'
+        except (URLError, OSError) as exc:
+            error = type(exc).__name__
+        elapsed = time.perf_counter() - started
+
+        with self.lock:
+            self.samples[route].append((elapsed, error is None))
+            if error:
+                self.errors[route][error] += 1
+
+    def choice(self, name):
+        with self.lock:
+            values = self.fixtures[name]
+            return self.random.choice(values) if values else None
+
+    def property_detail(self):
+        property_id = self.choice('property_ids')
+        if property_id is not None:
+            self.request('property_detail', f'/property/{property_id}')
+
+    def unit_rent_payments(self):
+        unit_id = self.choice('unit_ids')
+        if unit_id is not None:
+            self.request('unit_rent_payments', f'/unit/{unit_id}/rent_payments')
+
+    def record_rent_payment(self):
+        pair = self.choice('rent_payments')
+        if pair is None:
+            return
+        unit_id, rent_payment_id = pair
+        self.request('unit_rent_payments POST', f'/unit/{unit_id}/rent_payments', {
+            'rent_payment_id': rent_payment_id,
+            'amount': '25.00',
+            'payment_date': date.today().isoformat(),
+            'payment_method': 'Cash',
+            'notes': 'loadtest',
+        })
+
+    def vendor_suggestions(self):
+        # One request per keystroke, the way the autocomplete fires while typing
+        vendor = self.choice('vendors')
+        if not vendor:
+            return
+        for length in range(2, min(len(vendor), 8) + 1):
+            query = urlencode({'query': vendor[:length].lower()})
+            self.request('vendor_suggestions', f'/vendor-suggestions?{query}')
+
+    def mark_payable_as_paid(self):
+        # Each payable can only be paid once
+        with self.lock:
+            payable_ids = self.fixtures['payable_ids']
+            payable_id = payable_ids.pop() if payable_ids else None
+        if payable_id is None:
+            return
+        self.request('mark_payable_as_paid', f'/payable/{payable_id}/mark-as-paid', {
+            'date_paid': date.today().isoformat(),
+            'payment_method_type': 'Cash',
+        })
+
+    def worker(self, deadline):
+        scenarios = list(SCENARIO_WEIGHTS)
+        weights = [SCENARIO_WEIGHTS[name] for name in scenarios]
+        while time.monotonic() < deadline:
+            with self.lock:
+                scenario = self.random.choices(scenarios, weights)[0]
+            getattr(self, scenario)()
+
+    def run(self, concurrency, duration):
+        started = time.monotonic()
+        deadline = started + duration
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(self.worker, deadline)
+        return time.monotonic() - started
+
+    def report(self, elapsed):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            latencies = sorted(seconds for seconds, _ in samples)
+            failures = sum(1 for _, ok in samples if not ok)
+            routes[route] = {
+                'requests': len(samples),
+                'throughput_rps': len(samples) / elapsed,
+                'error_rate': failures / len(samples),
+                'errors': dict(self.errors[route]),
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+            }
+        return {'elapsed_seconds': elapsed, 'routes': routes}
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def print_report(report):
+    print(f"{'route':<28}{'requests':>10}{'req/s':>9}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, stats in report['routes'].items():
+        print(f"{route:<28}{stats['requests']:>10}{stats['throughput_rps']:>9.1f}"
+              f"{stats['error_rate']:>9.1%}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+        for error, count in stats['errors'].items():
+            print(f"    {error}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=12, help='Number of simulated staff members.')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run for.')
+    parser.add_argument('--fixture-limit', type=int, default=5000, help='Maximum ids loaded per model.')
+    parser.add_argument('--seed', type=int, help='Random seed for a repeatable traffic mix.')
+    parser.add_argument('--json', dest='json_path', help='Also write the report to this file.')
+    args = parser.parse_args()
+
+    load_test = LoadTest(args.base_url, load_fixtures(args.fixture_limit), seed=args.seed)
+    elapsed = load_test.run(args.concurrency, args.duration)
+    report = load_test.report(elapsed)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Add billing_period to RentPayment with a unique (unit_id, billing_period) constraint
+
+Revision ID: 3c9e4a71d2b8
+Revises: 60db00669379
+Create Date: 2026-10-17 09:12:44.581203
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e4a71d2b8'
+down_revision = '60db00669379'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.env')
+
+STATUS_RANK = {'Paid': 0, 'Partial': 1, 'Late': 2, 'Unpaid': 3}
+
+
+def merge_duplicate_invoices():
+    """Merge invoices billed twice for the same unit and month, so the unique constraint can be added.
+
+    Overlapping invoice job runs could create such duplicates. The most settled
+    invoice of each group is kept (Paid before Partial, then the oldest), the
+    others' payment transactions are moved onto it, and the extra invoices are deleted.
+    """
+    connection = op.get_bind()
+    rows = connection.execute(sa.text(
+        "SELECT rent_payment.id, rent_payment.unit_id, rent_payment.billing_period, rent_payment.status "
+        "FROM rent_payment JOIN ("
+        "  SELECT unit_id, billing_period FROM rent_payment"
+        "  GROUP BY unit_id, billing_period HAVING COUNT(*) > 1"
+        ") duplicate ON duplicate.unit_id = rent_payment.unit_id "
+        "AND duplicate.billing_period = rent_payment.billing_period"
+    )).all()
+
+    groups = {}
+    for row in rows:
+        groups.setdefault((row.unit_id, row.billing_period), []).append(row)
+    for (unit_id, billing_period), invoices in groups.items():
+        invoices.sort(key=lambda invoice: (STATUS_RANK.get(invoice.status, len(STATUS_RANK)), invoice.id))
+        keep, extra_ids = invoices[0].id, [invoice.id for invoice in invoices[1:]]
+        logger.warning('Merging duplicate invoices %s into %s (unit %s, %s)', extra_ids, keep, unit_id, billing_period)
+        connection.execute(
+            sa.text("UPDATE payment_transaction SET rent_payment_id = :keep WHERE rent_payment_id IN :extra_ids")
+            .bindparams(sa.bindparam('extra_ids', expanding=True)),
+            {'keep': keep, 'extra_ids': extra_ids})
+        connection.execute(
+            sa.text("DELETE FROM rent_payment WHERE id IN :extra_ids")
+            .bindparams(sa.bindparam('extra_ids', expanding=True)),
+            {'extra_ids': extra_ids})
+
+
+def upgrade():
+    with op.batch_alter_table('rent_payment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('billing_period', sa.Date(), nullable=True))
+
+    # Backfill from the existing due dates; the billing period is the first of the month
+    op.execute("UPDATE rent_payment SET billing_period = DATE_SUB(due_date, INTERVAL DAY(due_date) - 1 DAY)")
+    merge_duplicate_invoices()
+
+    with op.batch_alter_table('rent_payment', schema=None) as batch_op:
+        batch_op.alter_column('billing_period',
+               existing_type=sa.Date(),
+               nullable=False)
+        batch_op.create_unique_constraint('uq_rent_payment_unit_period', ['unit_id', 'billing_period'])
+
+
+def downgrade():
+    with op.batch_alter_table('rent_payment', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_rent_payment_unit_period', type_='unique')
+        batch_op.drop_column('billing_period')
@@ -0,0 +1,50 @@
+"""Add PropertyFinancialSummary table
+
+Revision ID: 5a7b0e3f91c2
+Revises: 9f2d61b7c4e5
+Create Date: 2026-10-17 11:26:51.904377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7b0e3f91c2'
+down_revision = '9f2d61b7c4e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('property_financial_summary',
+    sa.Column('property_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('year', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('month', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total_expenses', sa.Float(), nullable=False),
+    sa.Column('total_income', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['property_id'], ['property.id'], ),
+    sa.PrimaryKeyConstraint('property_id', 'year', 'month')
+    )
+
+    # Seed the table from existing history; `flask rebuild-financial-summary` does the same
+    op.execute("""
+        INSERT INTO property_financial_summary (property_id, year, month, total_expenses, total_income)
+        SELECT property_id, YEAR(date_paid), MONTH(date_paid), SUM(amount), 0
+        FROM expense
+        GROUP BY property_id, YEAR(date_paid), MONTH(date_paid)
+    """)
+    op.execute("""
+        INSERT INTO property_financial_summary (property_id, year, month, total_expenses, total_income)
+        SELECT unit.property_id, YEAR(payment_transaction.payment_date), MONTH(payment_transaction.payment_date),
+               0, SUM(payment_transaction.amount)
+        FROM payment_transaction
+        JOIN rent_payment ON rent_payment.id = payment_transaction.rent_payment_id
+        JOIN unit ON unit.id = rent_payment.unit_id
+        GROUP BY unit.property_id, YEAR(payment_transaction.payment_date), MONTH(payment_transaction.payment_date)
+        ON DUPLICATE KEY UPDATE total_income = VALUES(total_income)
+    """)
+
+
+def downgrade():
+    op.drop_table('property_financial_summary')
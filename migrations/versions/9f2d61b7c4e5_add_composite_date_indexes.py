@@ -0,0 +1,44 @@
+"""Add composite (owner, date) indexes for period filters
+
+Revision ID: 9f2d61b7c4e5
+Revises: 3c9e4a71d2b8
+Create Date: 2026-10-17 10:03:18.227415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f2d61b7c4e5'
+down_revision = '3c9e4a71d2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_property_date_paid', ['property_id', 'date_paid'], unique=False)
+
+    with op.batch_alter_table('payable', schema=None) as batch_op:
+        batch_op.create_index('ix_payable_property_due_date', ['property_id', 'due_date'], unique=False)
+
+    with op.batch_alter_table('rent_payment', schema=None) as batch_op:
+        batch_op.create_index('ix_rent_payment_unit_due_date', ['unit_id', 'due_date'], unique=False)
+
+    with op.batch_alter_table('payment_transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_payment_transaction_rent_payment_date', ['rent_payment_id', 'payment_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payment_transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_transaction_rent_payment_date')
+
+    with op.batch_alter_table('rent_payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_rent_payment_unit_due_date')
+
+    with op.batch_alter_table('payable', schema=None) as batch_op:
+        batch_op.drop_index('ix_payable_property_due_date')
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_property_date_paid')
@@ -0,0 +1,26 @@
+"""Add cache_version to Property for the fragment cache
+
+Revision ID: a3d6f0b85e21
+Revises: e7a15c3d8f40
+Create Date: 2026-10-17 17:12:48.530417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d6f0b85e21'
+down_revision = 'e7a15c3d8f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('property', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cache_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('property', schema=None) as batch_op:
+        batch_op.drop_column('cache_version')
@@ -0,0 +1,45 @@
+"""Add ReminderMessage outbox for rent reminders
+
+Revision ID: b52c9e7d4a18
+Revises: a3d6f0b85e21
+Create Date: 2026-10-17 18:04:21.772193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b52c9e7d4a18'
+down_revision = 'a3d6f0b85e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reminder_message',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rent_payment_id', sa.Integer(), nullable=False),
+    sa.Column('channel', sa.String(length=10), nullable=False),
+    sa.Column('recipient', sa.String(length=100), nullable=False),
+    sa.Column('subject', sa.String(length=200), nullable=True),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['rent_payment_id'], ['rent_payment.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('rent_payment_id', 'channel', name='uq_reminder_message_payment_channel')
+    )
+    with op.batch_alter_table('reminder_message', schema=None) as batch_op:
+        batch_op.create_index('ix_reminder_message_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reminder_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_reminder_message_status_next_attempt')
+
+    op.drop_table('reminder_message')
@@ -0,0 +1,56 @@
+"""Add Vendor table for autocomplete
+
+Revision ID: c4e8d2a6b013
+Revises: 5a7b0e3f91c2
+Create Date: 2026-10-17 13:41:07.615820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8d2a6b013'
+down_revision = '5a7b0e3f91c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    vendor_table = op.create_table('vendor',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('normalized_name', sa.String(length=100), nullable=False),
+    sa.Column('use_count', sa.Integer(), nullable=False),
+    sa.Column('last_used', sa.Date(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('normalized_name')
+    )
+
+    # Seed from existing expenses and payables, normalised as app.normalize_vendor does
+    # (lowercased, with runs of whitespace collapsed), so later saves find these rows
+    connection = op.get_bind()
+    vendors = {}
+    expense = sa.table('expense', sa.column('vendor', sa.String), sa.column('date_paid', sa.Date))
+    payable = sa.table('payable', sa.column('vendor', sa.String))
+    for table, last_used in ((expense, sa.func.max(expense.c.date_paid)), (payable, sa.null())):
+        rows = connection.execute(
+            sa.select(table.c.vendor, sa.func.count(), last_used).group_by(table.c.vendor)
+        ).all()
+        for name, count, used in rows:
+            name = ' '.join(name.split())
+            normalized = name.lower()
+            if not normalized:
+                continue
+            vendor = vendors.setdefault(normalized, {'name': name, 'normalized_name': normalized,
+                                                     'use_count': 0, 'last_used': None})
+            vendor['name'] = min(vendor['name'], name)
+            vendor['use_count'] += count
+            if used is not None and (vendor['last_used'] is None or used > vendor['last_used']):
+                vendor['last_used'] = used
+    if vendors:
+        op.bulk_insert(vendor_table, list(vendors.values()))
+
+
+def downgrade():
+    op.drop_table('vendor')
@@ -0,0 +1,65 @@
+"""Add is_charge to PaymentTransaction so late fee charges are told apart from payments
+
+Revision ID: d81f3a6c2e94
+Revises: b52c9e7d4a18
+Create Date: 2026-10-17 19:26:53.104772
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3a6c2e94'
+down_revision = 'b52c9e7d4a18'
+branch_labels = None
+depends_on = None
+
+ASSESSED_LATE_FEE_NOTE = 'Late fee assessed'
+MIGRATED_CHARGE_NOTE = 'Late fee charged'
+
+payment_transaction = sa.table(
+    'payment_transaction',
+    sa.column('id', sa.Integer), sa.column('rent_payment_id', sa.Integer), sa.column('amount', sa.Float),
+    sa.column('payment_date', sa.Date), sa.column('payment_method', sa.String), sa.column('notes', sa.Text),
+    sa.column('is_charge', sa.Boolean),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('payment_transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_charge', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    table = payment_transaction
+    is_fee = table.c.payment_method == 'Late Fee'
+    # Fees written by the assess_late_fees job are charges
+    op.execute(table.update().where(is_fee, table.c.notes == ASSESSED_LATE_FEE_NOTE).values(is_charge=True))
+
+    # Fees recorded by the payment form were collected without a matching charge; charge them
+    # too, so those invoices balance to zero instead of showing the fee as an overpayment
+    connection = op.get_bind()
+    fees_paid = sa.func.sum(sa.case((sa.and_(is_fee, ~table.c.is_charge), table.c.amount), else_=0))
+    rows = connection.execute(
+        sa.select(table.c.rent_payment_id, fees_paid.label('fees_paid'),
+                  sa.func.sum(sa.case((table.c.is_charge, table.c.amount), else_=0)).label('charged'),
+                  sa.func.max(sa.case((table.c.is_charge, table.c.id))).label('charge_id'),
+                  sa.func.min(sa.case((is_fee, table.c.payment_date))).label('fee_date'))
+        .group_by(table.c.rent_payment_id)
+        .having(fees_paid > 0)
+    ).all()
+    new_charges = [{'rent_payment_id': row.rent_payment_id, 'amount': row.fees_paid, 'payment_date': row.fee_date,
+                    'payment_method': 'Late Fee', 'notes': MIGRATED_CHARGE_NOTE, 'is_charge': True}
+                   for row in rows if row.charge_id is None]
+    if new_charges:
+        op.bulk_insert(table, new_charges)
+    for row in rows:
+        if row.charge_id is not None and row.charged < row.fees_paid:
+            connection.execute(table.update().where(table.c.id == row.charge_id)
+                               .values(amount=table.c.amount + (row.fees_paid - row.charged)))
+
+
+def downgrade():
+    op.execute(payment_transaction.delete().where(payment_transaction.c.notes == MIGRATED_CHARGE_NOTE,
+                                                  payment_transaction.c.is_charge))
+    with op.batch_alter_table('payment_transaction', schema=None) as batch_op:
+        batch_op.drop_column('is_charge')
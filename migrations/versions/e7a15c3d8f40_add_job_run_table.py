@@ -0,0 +1,42 @@
+"""Add JobRun table for batch job history
+
+Revision ID: e7a15c3d8f40
+Revises: c4e8d2a6b013
+Create Date: 2026-10-17 16:05:32.118946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a15c3d8f40'
+down_revision = 'c4e8d2a6b013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_run',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_name', sa.String(length=50), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('duration_seconds', sa.Float(), nullable=True),
+    sa.Column('rows_touched', sa.Integer(), nullable=False),
+    sa.Column('checkpoint', sa.String(length=100), nullable=True),
+    sa.Column('resumed_from_id', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['resumed_from_id'], ['job_run.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('job_run', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_job_run_job_name'), ['job_name'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('job_run', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_job_run_job_name'))
+
+    op.drop_table('job_run')
@@ -0,0 +1,181 @@
+# reminders.py
+"""Delivery backends for rent reminders: a reusable SMTP connection, SMS backends,
+a rate limiter and a local SMTP sink to point the app at while testing."""
+
+import importlib
+import logging
+import smtplib
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` sends per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def wait(self):
+        if not self.rate:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            time.sleep((1 - self._tokens) / self.rate)
+
+
+class SmtpEmailBackend:
+    """Sends email over one SMTP connection, opened on first use and reused until `close()`.
+
+    The connection is recycled after `max_messages_per_connection` messages, since
+    many servers cap how many a session may send, and reopened after a disconnect.
+    """
+
+    def __init__(self, host, port=25, username=None, password=None, use_tls=False,
+                 from_address='noreply@localhost', timeout=30, max_messages_per_connection=100):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.from_address = from_address
+        self.timeout = timeout
+        self.max_messages_per_connection = max_messages_per_connection
+        self._connection = None
+        self._sent_on_connection = 0
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        self._connection = connection
+        self._sent_on_connection = 0
+
+    def send(self, recipient, subject, body):
+        if self._connection is not None and self._sent_on_connection >= self.max_messages_per_connection:
+            self.close()
+        if self._connection is None:
+            self._connect()
+
+        message = EmailMessage()
+        message['From'] = self.from_address
+        message['To'] = recipient
+        message['Subject'] = subject
+        message.set_content(body)
+        try:
+            self._connection.send_message(message)
+        except smtplib.SMTPRecipientsRefused:
+            # The session is still usable; only this recipient failed
+            raise
+        except (smtplib.SMTPException, OSError):
+            self._discard()
+            raise
+        self._sent_on_connection += 1
+
+    def _discard(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.quit()
+            except (smtplib.SMTPException, OSError):
+                connection.close()
+
+
+class LoggingSmsBackend:
+    """SMS backend that only logs each message - the default until a provider is configured."""
+
+    def send(self, recipient, body):
+        logger.info('SMS to %s: %s', recipient, body)
+
+    def close(self):
+        pass
+
+
+def load_backend(path, **options):
+    """Instantiate a backend class named 'package.module:ClassName' (or 'package.module.ClassName')."""
+    module_name, _, class_name = path.rpartition(':') if ':' in path else path.rpartition('.')
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class(**options)
+
+
+class _SmtpSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost SMTP sink')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command.partition(':')[2].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.partition(':')[2].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while (data := self.rfile.readline()) and data.rstrip(b'\r\n') != b'.':
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                self.server.deliver(sender, recipients, b''.join(lines).decode('utf-8', 'replace'))
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                if verb == 'RSET':
+                    sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """A local SMTP server that accepts every message and keeps it in `messages`.
+
+    Point SMTP_HOST/SMTP_PORT at it to exercise reminder delivery without sending
+    real mail; `on_message(sender, recipients, data)` is called for each message.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=1025, on_message=None):
+        super().__init__((host, port), _SmtpSinkHandler)
+        self.messages = []
+        self.on_message = on_message
+        self._lock = threading.Lock()
+
+    def deliver(self, sender, recipients, data):
+        with self._lock:
+            self.messages.append((sender, recipients, data))
+        if self.on_message:
+            self.on_message(sender, recipients, data)
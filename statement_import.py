@@ -0,0 +1,167 @@
+# statement_import.py
+"""Streaming readers that turn bank and credit-card statements into expense rows."""
+
+import csv
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Statement header names recognised for each expense field (compared lowercased)
+COLUMN_ALIASES = {
+    'date': ['date', 'date paid', 'transaction date', 'trans. date', 'posted date', 'post date', 'posting date'],
+    'description': ['description', 'details', 'memo', 'transaction description'],
+    'amount': ['amount', 'debit', 'charge', 'charges', 'transaction amount'],
+    'vendor': ['vendor', 'payee', 'merchant', 'name'],
+    'category': ['category'],
+    'card': ['card', 'card number', 'card no.', 'card last four', 'last four', 'card member', 'account number'],
+    'check_number': ['check number', 'check no.', 'check #', 'check'],
+}
+
+DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y', '%Y%m%d']
+
+OFX_TAG = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+def detect_columns(fieldnames, mapping=None):
+    """Map expense fields to statement columns, preferring an explicit `mapping`."""
+    mapping = {field: column for field, column in (mapping or {}).items() if column}
+    by_name = {name.strip().lower(): name for name in fieldnames or []}
+    for field, aliases in COLUMN_ALIASES.items():
+        if field in mapping:
+            continue
+        for alias in aliases:
+            if alias in by_name:
+                mapping[field] = by_name[alias]
+                break
+    return mapping
+
+
+def iter_csv_records(stream, mapping=None):
+    """Yield (line_number, record) for each data row of a CSV statement, one row at a time."""
+    reader = csv.DictReader(stream)
+    columns = detect_columns(reader.fieldnames, mapping)
+    missing = [field for field in ('date', 'amount') if field not in columns]
+    if missing:
+        raise ValueError(f"Statement has no column for: {', '.join(missing)}")
+
+    for row in reader:
+        yield reader.line_num, {field: (row.get(column) or '').strip() for field, column in columns.items()}
+
+
+def iter_ofx_records(stream):
+    """Yield (transaction_number, record) for each <STMTTRN> of an OFX/QFX statement.
+
+    OFX 1.x is SGML without closing tags for leaf elements, so the statement is
+    scanned tag by tag rather than parsed as XML.
+    """
+    card = ''
+    in_card_account = False
+    record = None
+    number = 0
+    for line in stream:
+        for tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            value = value.strip()
+            if tag in ('CCACCTFROM', 'BANKACCTFROM'):
+                in_card_account = tag == 'CCACCTFROM'
+            elif tag == 'ACCTID' and in_card_account:
+                # Only credit-card statements identify a card to match against
+                card = value
+            elif tag == 'STMTTRN':
+                record = {'card': card}
+            elif record is None:
+                continue
+            elif tag == 'DTPOSTED':
+                record['date'] = value[:8]
+            elif tag == 'TRNAMT':
+                record['amount'] = value
+            elif tag == 'NAME':
+                record['vendor'] = value
+            elif tag == 'MEMO':
+                record['description'] = value
+            elif tag == 'CHECKNUM':
+                record['check_number'] = value
+        if record is not None and '</STMTTRN>' in line.upper():
+            number += 1
+            yield number, record
+            record = None
+
+
+def parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised date '{value}'")
+
+
+def parse_amount(value):
+    cleaned = value.replace('$', '').replace(',', '').strip()
+    negative = cleaned.startswith('(') and cleaned.endswith(')')
+    try:
+        amount = Decimal(cleaned.strip('()'))
+    except InvalidOperation:
+        raise ValueError(f"Unrecognised amount '{value}'")
+    if not amount.is_finite():
+        raise ValueError(f"Unrecognised amount '{value}'")
+    return -amount if negative else amount
+
+
+def build_expense_row(record, defaults, cards):
+    """Validate one statement record and return the column values for an Expense row.
+
+    `defaults` holds property_id, category, categories, payment_method_type,
+    card (a PaymentMethod used when the statement names no card) and
+    charges_negative; `cards` maps card last four digits to PaymentMethod.
+    Raises ValueError with a message for the error report.
+    """
+    if not record.get('date'):
+        raise ValueError('Missing date')
+    if not record.get('amount'):
+        raise ValueError('Missing amount')
+    date_paid = parse_date(record['date'])
+    amount = parse_amount(record['amount'])
+    if defaults['charges_negative']:
+        amount = -amount
+    if amount <= 0:
+        raise ValueError('Credit or zero amount skipped')
+
+    description = record.get('description') or record.get('vendor')
+    vendor = record.get('vendor') or record.get('description')
+    if not vendor:
+        raise ValueError('Missing description and vendor')
+
+    category = record.get('category') or defaults['category']
+    if category not in defaults['categories']:
+        raise ValueError(f"Unknown category '{category}'")
+
+    row = {
+        'property_id': defaults['property_id'],
+        'description': description[:200],
+        'amount': float(amount),
+        'date_paid': date_paid,
+        'category': category,
+        'vendor': vendor[:100],
+        'payment_method_type': defaults['payment_method_type'],
+        'card_last_four': None,
+        'card_type': None,
+        'check_number': record.get('check_number') or None,
+    }
+
+    card = defaults.get('card')
+    card_digits = re.sub(r'\D', '', record.get('card') or '')
+    if card_digits:
+        card = cards.get(card_digits[-4:])
+        if card is None:
+            raise ValueError(f"No credit card ending in {card_digits[-4:]}")
+    if card is not None:
+        row.update(payment_method_type='Credit Card', card_last_four=card.card_number[-4:],
+                   card_type=card.card_type, check_number=None)
+    elif row['payment_method_type'] == 'Credit Card':
+        raise ValueError('No credit card for row')
+    elif row['check_number']:
+        row['payment_method_type'] = 'Check'
+    if row['payment_method_type'] != 'Check':
+        row['check_number'] = None
+    return row
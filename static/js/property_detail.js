@@ -97,12 +97,33 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     });
 
-    // Handle "Mark as Paid" button clicks
-    document.querySelectorAll('.mark-as-paid-btn').forEach(button => {
+    // Handle "Mark as Paid" button clicks, including rows loaded later
+    document.addEventListener('click', function (e) {
+        const button = e.target.closest('.mark-as-paid-btn');
+        if (!button) {
+            return;
+        }
+        const payableId = button.getAttribute('data-payable-id');
+        paymentForm.action = `/payable/${payableId}/mark-as-paid`;
+        paymentModal.show();
+    });
+
+    // Load further pages of units, payables and expenses
+    document.querySelectorAll('.load-more').forEach(button => {
         button.addEventListener('click', function () {
-            const payableId = this.getAttribute('data-payable-id');
-            paymentForm.action = `/payable/${payableId}/mark-as-paid`;
-            paymentModal.show();
+            const url = `${this.dataset.url}?cursor=${encodeURIComponent(this.dataset.cursor)}`;
+            fetch(url)
+                .then(response => {
+                    const nextCursor = response.headers.get('X-Next-Cursor');
+                    return response.text().then(html => {
+                        document.getElementById(this.dataset.target).insertAdjacentHTML('beforeend', html);
+                        if (nextCursor) {
+                            this.dataset.cursor = nextCursor;
+                        } else {
+                            this.remove();
+                        }
+                    });
+                });
         });
     });
 
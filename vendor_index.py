@@ -0,0 +1,75 @@
+# vendor_index.py
+"""In-process prefix index behind the vendor autocomplete."""
+
+import threading
+import time
+from datetime import date
+
+MAX_PREFIX_LENGTH = 20
+
+
+def vendor_score(use_count, last_used, today):
+    # Frequently used vendors rank first, decaying with a month-scale half-life
+    days_idle = (today - last_used).days if last_used else 365
+    return use_count / (1 + max(days_idle, 0) / 30)
+
+
+class VendorIndex:
+    """Word-prefix lookup over vendor names, ranked by frequency and recency.
+
+    `loader` returns (name, use_count, last_used) rows. The index is rebuilt from it
+    when `invalidate()` has been called or after `ttl` seconds, so other processes'
+    writes show up without a query per keystroke.
+    """
+
+    def __init__(self, loader, ttl=60):
+        self.loader = loader
+        self.ttl = ttl
+        self.generation = 0
+        self._prefixes = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _is_fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def refresh(self):
+        if self._is_fresh():
+            return
+        with self._lock:
+            if self._is_fresh():
+                return
+            self._prefixes = self._build(self.loader())
+            self._loaded_at = time.monotonic()
+            self.generation += 1
+
+    @staticmethod
+    def _build(vendors):
+        today = date.today()
+        ranked = sorted(vendors, key=lambda row: (-vendor_score(row[1], row[2], today), row[0].lower()))
+
+        prefixes = {}
+        for name, _, _ in ranked:
+            normalized = name.lower()
+            words = normalized.split()
+            keys = set()
+            # Index every word boundary, so "ed" finds "Con Edison"
+            for position in range(len(words)):
+                tail = ' '.join(words[position:])
+                keys.update(tail[:length] for length in range(1, min(len(tail), MAX_PREFIX_LENGTH) + 1))
+            for key in keys:
+                prefixes.setdefault(key, []).append((normalized, name))
+        return prefixes
+
+    def search(self, query, limit=10):
+        self.refresh()
+        query = ' '.join(query.lower().split())
+        if not query:
+            return []
+        matches = self._prefixes.get(query[:MAX_PREFIX_LENGTH], [])
+        if len(query) > MAX_PREFIX_LENGTH:
+            matches = [match for match in matches if query in match[0]]
+        return [name for _, name in matches[:limit]]